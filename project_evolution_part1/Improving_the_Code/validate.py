@@ -3,53 +3,48 @@
 
 # In[1]:
 
-import great_expectations as gx
+import os
+import sys
 import logging
 import pandas as pd
 
+# Motor de regras compartilhado com o pipeline do Airflow (project_evolution_part2)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..',
+                             'project_evolution_part2', 'dags', 'scripts'))
+import regras
+
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+#Regras para clientes (antes expectativas do Great Expectations; nulos são ignorados no regex, como no GE)
+REGRAS_CLIENTES = regras.compila([
+    {'id': 'nome_nao_nulo', 'tipo': 'not_null', 'coluna': 'nome'},
+    {'id': 'email_formato', 'tipo': 'regex', 'coluna': 'email', 'padrao': r"[^@]+@[^@]+\.[^@]+", 'permite_nulo': True},
+])
 
-def validate_data(clientes: pd.DataFrame, vendas: pd.DataFrame):
-    logger.info("Iniciando validação de dados...")
-
-    # Cria (ou pega) o contexto do projeto GE
-    context = gx.get_context()
-
-    # Cria validadores a partir de DataFrames
-    clientes_validator = context.sources.pandas_default.read_dataframe(clientes)
-    vendas_validator = context.sources.pandas_default.read_dataframe(vendas)
+#Regras para vendas
+REGRAS_VENDAS = regras.compila([
+    {'id': 'id_cliente_raw_nao_nulo', 'tipo': 'not_null', 'coluna': 'id_cliente_raw'},
+    {'id': 'valor_venda_faixa', 'tipo': 'range', 'coluna': 'valor_venda', 'min': 0, 'max': 100000, 'permite_nulo': True},
+    {'id': 'data_venda_tipo', 'tipo': 'dtype', 'coluna': 'data_venda', 'dtype': 'datetime64[ns]'},
+])
 
-    #Definindo expectativas para clientes
-    clientes_validator.expect_column_values_to_not_be_null("nome")
-    clientes_validator.expect_column_values_to_match_regex("email", r"[^@]+@[^@]+\.[^@]+")
 
-    #Definindo expectativas para vendas
-    vendas_validator.expect_column_values_to_not_be_null("id_cliente_raw")
-    vendas_validator.expect_column_values_to_be_between("valor_venda", min_value=0, max_value=100000)
-    vendas_validator.expect_column_values_to_be_of_type("data_venda", "datetime64[ns]")
-
-    logger.info("Expectativas definidas. Executando validação...")
-
-    #Salva suites para reuso
-    context.add_or_update_expectation_suite("clientes_suite", clientes_validator.get_expectation_suite())
-    context.add_or_update_expectation_suite("vendas_suite", vendas_validator.get_expectation_suite())
+def validate_data(clientes: pd.DataFrame, vendas: pd.DataFrame, amostra: int = 0):
+    logger.info("Iniciando validação de dados...")
 
-    #Executa validações
-    clientes_results = clientes_validator.validate()
-    vendas_results = vendas_validator.validate()
+    clientes_results = regras.avalia(clientes, REGRAS_CLIENTES, amostra=amostra)
+    vendas_results = regras.avalia(vendas, REGRAS_VENDAS, amostra=amostra)
 
-    # Gera Data Docs (HTML de relatório)
-    context.build_data_docs()
+    logger.info(f"Validação concluída. Falhas em clientes: {clientes_results['falhas']}; "
+                f"falhas em vendas: {vendas_results['falhas']}")
 
-    logger.info(
-        "Validação concluída. Relatório salvo em: great_expectations/uncommitted/data_docs/local_site/index.html"
-    )
+    for id_regra, amostra_falhas in {**clientes_results['amostras'], **vendas_results['amostras']}.items():
+        logger.info(f"Amostra de linhas reprovadas na regra {id_regra}:\n{amostra_falhas}")
 
-    #Se qualquer suite falhar, retorna DataFrames e False
-    if not clientes_results.success or not vendas_results.success:
+    #Se qualquer regra falhar, retorna DataFrames e False
+    if not clientes_results['valido'].all() or not vendas_results['valido'].all():
         logger.error("Validação apresentou falhas!")
         return clientes, vendas, False
 
-    return clientes, vendas, True
\ No newline at end of file
+    return clientes, vendas, True
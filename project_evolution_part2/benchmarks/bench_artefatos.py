@@ -0,0 +1,114 @@
+"""Artefatos entre tasks: pickle (caminho antigo) contra Parquet lido com projeção de colunas.
+
+Mede gravação, leitura e pico de memória de cada etapa sobre um extraído sintético. A leitura
+Parquet é a que validate.main faz (artefatos.carregar só com COLUNAS_ENTRADA e categorias vindas
+do dicionário); a do pickle desserializa o arquivo inteiro, como o pd.read_pickle antigo. O pico
+é o acréscimo de RSS durante a etapa, medido pelo VmHWM do Linux (zerado antes de cada etapa).
+
+Uso:
+    python benchmarks/bench_artefatos.py [--linhas 1000000] [--pasta /tmp/bench_artefatos]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'dags', 'scripts'))
+
+import artefatos  # noqa: E402
+import validate  # noqa: E402
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.getLogger('artefatos').setLevel(logging.WARNING)
+
+
+def extraido_sintetico(n: int, seed: int = 0) -> pd.DataFrame:
+    """DataFrame com as colunas do df_extraido e colunas extras que a validação não lê."""
+    rng = np.random.default_rng(seed)
+    ids = rng.integers(0, n // 5 + 1, n)
+    return pd.DataFrame({
+        'id_cliente_raw': ids,
+        'nome': np.array([f'Cliente {i}' for i in ids], dtype=object),
+        'email': np.array([f'cliente{i}@exemplo.com' for i in ids], dtype=object),
+        'cidade': rng.choice(np.array(['São Paulo', 'Rio de Janeiro', 'Curitiba'], dtype=object), n),
+        'estado': rng.choice(np.array(['SP', 'RJ', 'PR'], dtype=object), n),
+        'id_venda_raw': np.arange(n),
+        'data_venda': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, n), unit='D'),
+        'valor_venda': np.round(rng.uniform(1, 1000, n), 2),
+        'status_pedido': rng.choice(np.array(['concluído', 'pendente', 'atrasado'], dtype=object), n),
+        'observacao': np.array(['texto livre que nenhuma task usa'] * n, dtype=object),
+    })
+
+
+def _rss_mb(campo: str) -> float:
+    with open('/proc/self/status') as f:
+        for linha in f:
+            if linha.startswith(campo + ':'):
+                return int(linha.split()[1]) / 1024
+    return float('nan')
+
+
+def _mede(funcao) -> tuple:
+    """Executa `funcao` e retorna (segundos, acréscimo de pico de RSS em MB, resultado)."""
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')  # zera o VmHWM (pico) para o RSS atual
+    antes = _rss_mb('VmRSS')
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return time.perf_counter() - inicio, _rss_mb('VmHWM') - antes, resultado
+
+
+def bench(linhas: int, pasta: str) -> None:
+    df = extraido_sintetico(linhas)
+    caminho_pickle = os.path.join(pasta, 'df_extraido.pkl')
+
+    etapas = [
+        ('grava pickle', lambda: df.to_pickle(caminho_pickle), caminho_pickle),
+        ('grava parquet', lambda: artefatos.salvar(df, 'df_extraido', pasta), os.path.join(pasta, 'df_extraido.parquet')),
+    ]
+    resultados = []
+    for nome, funcao, destino in etapas:
+        segundos, pico, _ = _mede(funcao)
+        resultados.append((nome, segundos, pico, os.path.getsize(destino) / 1024 ** 2))
+    del df
+
+    leituras = [
+        ('lê pickle', lambda: pd.read_pickle(caminho_pickle)),
+        ('lê parquet (validate)', lambda: artefatos.carregar(os.path.join(pasta, 'df_extraido.parquet'),
+                                                              colunas=validate.COLUNAS_ENTRADA, compactar=True,
+                                                              strings_arrow=False)),
+    ]
+    for nome, funcao in leituras:
+        segundos, pico, lido = _mede(funcao)
+        resultados.append((nome, segundos, pico, artefatos.uso_memoria_mb(lido)))
+        del lido
+
+    print(f"{'etapa':<24}{'segundos':>10}{'pico (MB)':>11}{'tamanho (MB)':>14}")
+    for nome, segundos, pico, tamanho in resultados:
+        print(f"{nome:<24}{segundos:>10.2f}{pico:>11.0f}{tamanho:>14.1f}")
+    print("tamanho: arquivo gravado nas gravações; DataFrame em memória nas leituras")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pickle x Parquet com projeção de colunas.")
+    parser.add_argument('--linhas', type=int, default=1000000)
+    parser.add_argument('--pasta', default=None, help="Onde gravar os arquivos (padrão: pasta temporária).")
+    args = parser.parse_args()
+    if not os.path.exists('/proc/self/clear_refs'):
+        parser.error("a medida de pico usa /proc (Linux)")
+
+    if args.pasta:
+        bench(args.linhas, args.pasta)
+    else:
+        with tempfile.TemporaryDirectory(prefix='bench_artefatos_') as pasta:
+            bench(args.linhas, pasta)
+
+
+if __name__ == "__main__":
+    main()
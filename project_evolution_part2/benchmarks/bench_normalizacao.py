@@ -0,0 +1,100 @@
+"""Benchmark da normalização por valor distinto (normalizacao.py) contra o .str linha a linha.
+
+Gera colunas com cardinalidades próximas das do arquivo de vendas (muitos nomes, centenas de
+cidades, 27 estados e um punhado de grafias de status) e mede, por coluna, o caminho antigo
+(.str.strip().str.title(), .str.lower(), .map(status_map)) e normaliza() com o cache frio e
+com o cache já aquecido por um lote anterior, como acontece na validação em lotes. Antes de
+medir, confere que os dois caminhos produzem os mesmos valores.
+
+Uso:
+    python benchmarks/bench_normalizacao.py [--linhas 1000000] [--repeticoes 3]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'dags', 'scripts'))
+
+import artefatos  # noqa: E402
+import normalizacao  # noqa: E402
+import validate  # noqa: E402
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Valores distintos por coluna
+CARDINALIDADES = {'nome': 50000, 'email': 200000, 'cidade': 500, 'estado': 27}
+STATUS = ['concluído', 'Concluído ', 'finalizado', 'pendente', 'em trânsito', 'encaminhado', 'atrasado', 'cancelado']
+
+
+def dados_sinteticos(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    colunas = {}
+    for coluna, distintos in CARDINALIDADES.items():
+        universo = np.array([f"  {coluna} {i} exemplo  " for i in range(distintos)], dtype=object)
+        colunas[coluna] = universo[rng.integers(0, distintos, n)]
+    colunas['status_pedido'] = np.array(STATUS, dtype=object)[rng.integers(0, len(STATUS), n)]
+    return pd.DataFrame(colunas)
+
+
+def _status_antigo(serie: pd.Series) -> pd.Series:
+    return serie.astype(str).str.strip().str.lower().map(validate.STATUS_MAP)
+
+
+# coluna -> (caminho antigo linha a linha, função aplicada por valor distinto)
+CASOS = {
+    'nome': (lambda s: s.str.strip().str.title(), lambda v: v.strip().title()),
+    'email': (lambda s: s.str.strip().str.lower(), lambda v: v.strip().lower()),
+    'cidade': (lambda s: s.str.strip(), str.strip),
+    'estado': (lambda s: s.str.strip().str[:2], lambda v: v.strip()[:2]),
+    'status_pedido': (_status_antigo, validate._status),
+}
+
+
+def _mede(funcao, repeticoes: int, antes=None) -> float:
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        if antes:
+            antes()
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Normalização por valor distinto x .str linha a linha.")
+    parser.add_argument('--linhas', type=int, default=1000000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    df = dados_sinteticos(args.linhas)
+    print(f"{'coluna':<15}{'dtype':>10}{'distintos':>10}{'linha a linha (s)':>19}{'frio (s)':>10}{'quente (s)':>12}"
+          f"{'ganho frio':>12}")
+    for coluna, (antigo, funcao) in CASOS.items():
+        # object: textos como no pandas 2 da imagem do Airflow; str: padrão do pandas 3 (Arrow);
+        # category: o que compacta() entrega ao validate nas colunas de baixa cardinalidade
+        tipos = ['object', 'str'] + (['category'] if coluna in artefatos.COLUNAS_CATEGORICAS else [])
+        for tipo in tipos:
+            serie = df[coluna].astype(tipo)
+            novo = lambda: normalizacao.normaliza(serie, coluna, funcao)  # noqa: E731
+
+            normalizacao.limpa_caches()
+            if coluna != 'status_pedido':
+                # O mapa antigo de status não reconhece as variantes com espaço e maiúscula
+                pd.testing.assert_series_equal(novo().astype(object), antigo(serie).astype(object), check_names=False)
+
+            tempo_antigo = _mede(lambda: antigo(serie), args.repeticoes)
+            tempo_frio = _mede(novo, args.repeticoes, antes=normalizacao.limpa_caches)
+            tempo_quente = _mede(novo, args.repeticoes)
+            print(f"{coluna:<15}{tipo:>10}{df[coluna].nunique():>10}{tempo_antigo:>19.3f}{tempo_frio:>10.3f}"
+                  f"{tempo_quente:>12.3f}{tempo_antigo / tempo_frio:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
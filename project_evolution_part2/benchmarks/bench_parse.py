@@ -0,0 +1,104 @@
+"""Tempo de leitura e tipagem do CSV de vendas: EXTRACT_CSV_ENGINE=pandas contra pyarrow.
+
+Gera CSVs sintéticos no formato de novas_vendas.csv com os tamanhos pedidos e mede, para cada
+motor, a leitura completa por extract._le_csv (blocos já tipados, como a ingestão os grava em
+staging). Antes de medir, confere que os dois motores devolvem o mesmo total de linhas.
+
+Uso:
+    python benchmarks/bench_parse.py [--tamanhos-mb 50 200 1000] [--repeticoes 3] [--pasta /tmp/bench_parse]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'dags', 'scripts'))
+
+import extract  # noqa: E402
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+for nome in ['extract', 'artefatos']:
+    logging.getLogger(nome).setLevel(logging.WARNING)
+
+MOTORES = ['pandas', 'pyarrow']
+
+
+def gera_csv(caminho: str, megabytes: float, seed: int = 0) -> None:
+    """CSV com o cabeçalho de extract.colunas_csv e `megabytes` MB, repetindo um bloco de 100 mil linhas."""
+    rng = np.random.default_rng(seed)
+    n = 100000
+    ids = rng.integers(0, 50000, n)
+    bloco = pd.DataFrame({
+        'nome': [f'Cliente {i}' for i in ids],
+        'email': [f'cliente{i}@exemplo.com' for i in ids],
+        'cidade': rng.choice(['São Paulo', 'Rio de Janeiro', 'Curitiba', ''], n),
+        'estado': rng.choice(['SP', 'RJ', 'PR', ''], n),
+        'id_cliente': ids,
+        'data_venda': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, n), unit='D'),
+        'valor_venda': np.round(rng.uniform(1, 1000, n), 2),
+        'status_pedido': rng.choice(['concluído', 'pendente', 'atrasado', 'em trânsito'], n),
+    }).to_csv(header=False, index=False, date_format='%Y-%m-%d')
+    with open(caminho, 'w', encoding='utf-8') as f:
+        f.write(','.join(extract.colunas_csv) + '\n')
+        while f.tell() < megabytes * 1024 ** 2:
+            f.write(bloco)
+
+
+def le(caminho: str, motor: str) -> tuple:
+    """Lê o arquivo inteiro com `motor`; retorna (segundos, linhas)."""
+    extract.csv_engine = motor
+    inicio = time.perf_counter()
+    linhas = sum(len(bloco) for bloco in extract._le_csv(caminho, 'utf-8'))
+    return time.perf_counter() - inicio, linhas
+
+
+def bench(tamanhos: list, repeticoes: int, pasta: str) -> None:
+    resultados = []
+    for megabytes in tamanhos:
+        caminho = os.path.join(pasta, f'vendas_{megabytes:g}mb.csv')
+        gera_csv(caminho, megabytes)
+        tamanho_real = os.path.getsize(caminho) / 1024 ** 2
+        logger.info(f"{caminho}: {tamanho_real:.0f} MB")
+
+        tempos = {}
+        for motor in MOTORES:
+            medidas = [le(caminho, motor) for _ in range(repeticoes)]
+            tempos[motor] = min(segundos for segundos, _ in medidas)
+            linhas = medidas[0][1]
+            resultados.append((tamanho_real, motor, linhas, tempos[motor]))
+        if len({linhas for _, _, linhas, _ in resultados[-len(MOTORES):]}) != 1:
+            raise SystemExit(f"Os motores leram totais de linhas diferentes em {caminho}")
+        os.remove(caminho)
+
+    print(f"{'MB':>8}{'motor':>10}{'linhas':>12}{'segundos':>10}{'MB/s':>8}{'linhas/s':>12}")
+    for tamanho_real, motor, linhas, segundos in resultados:
+        print(f"{tamanho_real:>8.0f}{motor:>10}{linhas:>12}{segundos:>10.2f}"
+              f"{tamanho_real / segundos:>8.0f}{linhas / segundos:>12.0f}")
+    for tamanho_real in sorted({r[0] for r in resultados}):
+        pandas, pyarrow = (next(s for t, m, _, s in resultados if t == tamanho_real and m == motor) for motor in MOTORES)
+        print(f"{tamanho_real:.0f} MB: pyarrow {pandas / pyarrow:.1f}x o pandas")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Leitura do CSV de vendas com pandas e com pyarrow.")
+    parser.add_argument('--tamanhos-mb', type=float, nargs='+', default=[50, 200, 1000])
+    parser.add_argument('--repeticoes', type=int, default=3, help="Vale o melhor tempo de cada motor.")
+    parser.add_argument('--pasta', default=None, help="Onde gerar os CSVs (padrão: pasta temporária).")
+    args = parser.parse_args()
+
+    if args.pasta:
+        os.makedirs(args.pasta, exist_ok=True)
+        bench(args.tamanhos_mb, args.repeticoes, args.pasta)
+    else:
+        with tempfile.TemporaryDirectory(prefix='bench_parse_') as pasta:
+            bench(args.tamanhos_mb, args.repeticoes, pasta)
+
+
+if __name__ == "__main__":
+    main()
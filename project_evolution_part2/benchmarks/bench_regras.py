@@ -0,0 +1,103 @@
+"""Micro-benchmark das regras de validate.py: máscara vetorizada contra a lambda antiga (.apply).
+
+Cada regra é medida isoladamente em 10 mil, 1 milhão e 10 milhões de linhas sintéticas. O
+script termina com código 1 se alguma máscara ficar mais lenta que a lambda correspondente,
+para que uma regressão na vetorização seja percebida.
+
+Uso:
+    python benchmarks/bench_regras.py [--linhas 10000,1000000,10000000] [--repeticoes 3] [--sem-lambda]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'dags', 'scripts'))
+
+import regras  # noqa: E402
+import validate  # noqa: E402
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.getLogger('regras').setLevel(logging.WARNING)
+
+# Regras como eram antes da vetorização, aplicadas às mesmas colunas já limpas
+LAMBDAS_ANTIGAS = {
+    'email_valido': ('email', lambda x: isinstance(x, str) and '@' in x and x not in ['', 'nan']),
+    'nome_valido': ('nome', lambda x: isinstance(x, str) and len(x.strip()) > 0),
+    'valor_venda_valido': ('valor_venda', lambda x: pd.notna(x) and x >= 0),
+}
+
+
+def dados_sinteticos(n: int, seed: int = 0) -> tuple:
+    """Colunas limpas com ~5% de valores inválidos por regra e 1% de ids de cliente descartados."""
+    rng = np.random.default_rng(seed)
+    ids_clientes = rng.integers(1, max(n // 10, 2), n)
+    df = pd.DataFrame({
+        'email': np.where(rng.random(n) < 0.05, 'sem-arroba', 'cliente@exemplo.com').astype(object),
+        'nome': np.where(rng.random(n) < 0.05, '', 'Maria Silva').astype(object),
+        'valor_venda': np.where(rng.random(n) < 0.05, -1.0, rng.uniform(0, 1000, n)),
+        'id_cliente_raw': ids_clientes,
+    })
+    validos = set(np.unique(ids_clientes)[::100].tolist()) ^ set(np.unique(ids_clientes).tolist())
+    return df, validos
+
+
+def _mede(funcao, repeticoes: int) -> float:
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def bench(n: int, repeticoes: int, com_lambda: bool = True) -> list:
+    df, validos = dados_sinteticos(n)
+    contexto = {'clientes_validos_ids': validos}
+    compiladas = dict(validate.REGRAS_CLIENTES + validate.REGRAS_VENDAS)
+    resultados = []
+    for id_regra in ['email_valido', 'nome_valido', 'valor_venda_valido', 'cliente_valido']:
+        mascara = _mede(lambda: compiladas[id_regra](df, contexto), repeticoes)
+        tempo_lambda = None
+        if com_lambda:
+            if id_regra == 'cliente_valido':
+                coluna, funcao = 'id_cliente_raw', (lambda x: x in validos)
+            else:
+                coluna, funcao = LAMBDAS_ANTIGAS[id_regra]
+            tempo_lambda = _mede(lambda: df[coluna].apply(funcao), repeticoes)
+        resultados.append({'regra': id_regra, 'linhas': n, 'mascara_s': mascara, 'lambda_s': tempo_lambda})
+    return resultados
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Tempo de cada regra de validação, máscara x lambda.")
+    parser.add_argument('--linhas', default='10000,1000000,10000000', help="Tamanhos, separados por vírgula.")
+    parser.add_argument('--repeticoes', type=int, default=3, help="Melhor de N execuções por medida.")
+    parser.add_argument('--sem-lambda', action='store_true', help="Mede só as máscaras (mais rápido em 10M).")
+    args = parser.parse_args()
+
+    regressoes = []
+    print(f"{'regra':<20}{'linhas':>12}{'máscara (s)':>14}{'lambda (s)':>14}{'ganho':>10}")
+    for n in [int(valor) for valor in args.linhas.split(',')]:
+        for r in bench(n, args.repeticoes, com_lambda=not args.sem_lambda):
+            if r['lambda_s'] is None:
+                print(f"{r['regra']:<20}{r['linhas']:>12}{r['mascara_s']:>14.4f}{'-':>14}{'-':>10}")
+                continue
+            ganho = r['lambda_s'] / r['mascara_s'] if r['mascara_s'] else float('inf')
+            print(f"{r['regra']:<20}{r['linhas']:>12}{r['mascara_s']:>14.4f}{r['lambda_s']:>14.4f}{ganho:>9.1f}x")
+            if ganho < 1:
+                regressoes.append(f"{r['regra']} em {r['linhas']} linhas")
+
+    if regressoes:
+        logger.error(f"Máscaras mais lentas que a lambda antiga: {', '.join(regressoes)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,8 +8,8 @@ import os
 # Adiciona a pasta scripts no path para importar seus módulos
 sys.path.append('/opt/airflow/dags/scripts')
 
+import migracoes
 import extract
-import transform
 import validate
 import load
 import analise_gera_csv
@@ -46,16 +46,17 @@ with DAG(
         python_callable=ignore_warnings
     )
 
+    # Aplica as migrações pendentes do banco antes de qualquer leitura ou escrita
+    task_migracoes = PythonOperator(
+        task_id='aplicar_migracoes',
+        python_callable=migracoes.aplicar
+    )
+
     task_extract = PythonOperator(
         task_id='extract_data',
         python_callable=extract.main
     )
 
-    task_transform = PythonOperator(
-        task_id='transform_data',
-        python_callable=transform.main,
-    )
-
     task_validate = PythonOperator(
         task_id='validate_data',
         python_callable=validate.main,
@@ -94,4 +95,4 @@ with DAG(
     )
 
     # Define a ordem das tarefas
-    task_ignore_warnings >> task_extract >> task_transform >> task_validate >> task_load >> task_analise >> task_pdf >> task_send_email
\ No newline at end of file
+    task_ignore_warnings >> task_migracoes >> task_extract >> task_validate >> task_load >> task_analise >> task_pdf >> task_send_email
\ No newline at end of file
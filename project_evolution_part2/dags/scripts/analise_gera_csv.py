@@ -1,73 +1,69 @@
 import os
 import logging
-import psycopg2
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
-from dotenv import load_dotenv
 
-
-def run_analysis(temp_dir="/opt/airflow/temp", db_host="postgres", db_name="vendas_db", db_user="airflow", db_password=None):
+import db
+
+
+# Consultas do relatório; ficam no nível do módulo para a verificação de poda de partições (particionamento.py)
+def sql_top_10_clientes(dias=7):
+    return f"""
+        SELECT 
+            c.id_cliente, 
+            c.nome, 
+            SUM(v.valor_venda) as total_vendas, 
+            COUNT(v.id_venda) as qtd_compras
+        FROM clientes c
+        JOIN vendas v ON c.id_cliente = v.id_cliente
+        WHERE v.data_venda >= CURRENT_DATE - INTERVAL '{dias} days'
+        AND v.status_pedido = 'entregue'
+        GROUP BY c.id_cliente, c.nome
+        ORDER BY total_vendas DESC
+        LIMIT 10;
+    """
+
+
+def sql_atraso_clientes(dias=30):
+    return f"""
+        SELECT
+            c.id_cliente,
+            c.nome,
+            v.id_venda,
+            v.data_venda,
+            c.email,
+            c.estado,
+            v.status_pedido
+        FROM clientes c
+        JOIN vendas v ON c.id_cliente = v.id_cliente
+        WHERE v.status_pedido = 'atrasado'
+        AND v.data_venda >= DATE_TRUNC('day', CURRENT_DATE) - INTERVAL '{dias} days'
+        ORDER BY c.id_cliente, v.data_venda DESC;
+    """
+
+
+def run_analysis(temp_dir="/opt/airflow/temp", db_host=None, db_name=None, db_user=None, db_password=None):
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger(__name__)
 
     if not os.path.exists(temp_dir):
         os.makedirs(temp_dir)
 
-    if db_password is None:
-        load_dotenv('/opt/airflow/.env')
-        db_password = os.getenv("DB_PASSWORD")
-
-    if not db_password:
-        raise ValueError("Senha do banco de dados não foi definida no arquivo .env ou parâmetro")
+    # Parâmetros não informados usam a configuração do .env (módulo db)
+    conexao_params = dict(host=db_host, database=db_name, user=db_user, password=db_password)
 
     def get_top_10_clientes(conn, dias=7):
-        query = f"""
-            SELECT 
-                c.id_cliente, 
-                c.nome, 
-                SUM(v.valor_venda) as total_vendas, 
-                COUNT(v.id_venda) as qtd_compras
-            FROM clientes c
-            JOIN vendas v ON c.id_cliente = v.id_cliente
-            WHERE v.data_venda >= CURRENT_DATE - INTERVAL '{dias} days'
-            AND v.status_pedido = 'entregue'
-            GROUP BY c.id_cliente, c.nome
-            ORDER BY total_vendas DESC
-            LIMIT 10;
-        """
-        return pd.read_sql(query, conn)
+        return pd.read_sql(sql_top_10_clientes(dias), conn)
 
     def atraso_clientes(conn, dias=30):
-        query = f"""
-            SELECT
-                c.id_cliente,
-                c.nome,
-                v.id_venda,
-                v.data_venda,
-                c.email,
-                c.estado,
-                v.status_pedido
-            FROM clientes c
-            JOIN vendas v ON c.id_cliente = v.id_cliente
-            WHERE v.status_pedido = 'atrasado'
-            AND v.data_venda >= DATE_TRUNC('day', CURRENT_DATE) - INTERVAL '{dias} days'
-            ORDER BY c.id_cliente, v.data_venda DESC;
-        """
-        return pd.read_sql(query, conn)
-
-    conn = None
-    try:
-        conn = psycopg2.connect(
-            host=db_host,
-            database=db_name,
-            user=db_user,
-            password=db_password
-        )
-        logger.info("Conexão bem-sucedida com o banco.")
+        return pd.read_sql(sql_atraso_clientes(dias), conn)
 
-        top_10 = get_top_10_clientes(conn, dias=7)
-        atrasados = atraso_clientes(conn, dias=30)
+    try:
+        with db.conexao(**conexao_params) as conn:
+            logger.info("Conexão bem-sucedida com o banco.")
+            top_10 = get_top_10_clientes(conn, dias=7)
+            atrasados = atraso_clientes(conn, dias=30)
 
         # Salvar CSVs
         csv_top_10 = os.path.join(temp_dir, 'top_10_clientes.csv')
@@ -139,10 +135,6 @@ def run_analysis(temp_dir="/opt/airflow/temp", db_host="postgres", db_name="vend
     except Exception as e:
         logger.error(f"Erro na execução da análise: {e}")
         raise
-    finally:
-        if conn:
-            conn.close()
-            logger.info("Conexão com o banco encerrada.")
 
 
 if __name__ == "__main__":
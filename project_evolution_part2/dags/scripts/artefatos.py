@@ -0,0 +1,136 @@
+import os
+import logging
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Pasta compartilhada entre as tasks da DAG para os arquivos intermediários
+TEMP_DIR = '/opt/airflow/temp'
+
+# Colunas de baixa cardinalidade mantidas como category (dicionário no Parquet)
+COLUNAS_CATEGORICAS = ['status_pedido', 'estado', 'cidade']
+
+
+def caminho(nome: str, temp_dir: str = TEMP_DIR) -> str:
+    """Caminho do artefato `nome` (sem extensão) na pasta temporária."""
+    os.makedirs(temp_dir, exist_ok=True)
+    return os.path.join(temp_dir, f'{nome}.parquet')
+
+
+def salvar(df: pd.DataFrame, nome: str, temp_dir: str = TEMP_DIR) -> str:
+    """Grava o DataFrame em Parquet e retorna o caminho, para ser repassado via XCom."""
+    destino = caminho(nome, temp_dir)
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(tabela, destino)
+    logger.info(f"Artefato salvo em {destino} ({len(df)} linhas, {tabela.nbytes / 1024 ** 2:.1f} MB em memória).")
+    return destino
+
+
+def uso_memoria_mb(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def compacta(df: pd.DataFrame, rotulo: str = None, strings_arrow: bool = True) -> pd.DataFrame:
+    """Aplica a política de tipos compactos: category nas colunas de baixa cardinalidade,
+    inteiros reduzidos ao menor tipo que cabe e, opcionalmente, textos como string[pyarrow].
+
+    Com `rotulo`, registra no log a memória antes e depois.
+    """
+    antes = uso_memoria_mb(df) if rotulo else None
+
+    # Cópia rasa: as colunas convertidas substituem as originais sem alterar quem chamou
+    df = df.copy(deep=False)
+    for coluna in df.columns:
+        serie = df[coluna]
+        if coluna in COLUNAS_CATEGORICAS:
+            if not isinstance(serie.dtype, pd.CategoricalDtype):
+                df[coluna] = serie.astype('category')
+        elif pd.api.types.is_integer_dtype(serie.dtype):
+            df[coluna] = pd.to_numeric(serie, downcast='integer')
+        elif strings_arrow and serie.dtype == object and pd.api.types.infer_dtype(serie, skipna=True) == 'string':
+            df[coluna] = serie.astype('string[pyarrow]')
+
+    if rotulo:
+        depois = uso_memoria_mb(df)
+        economia = (1 - depois / antes) * 100 if antes else 0.0
+        logger.info(f"{rotulo}: {antes:.1f} MB -> {depois:.1f} MB com tipos compactos ({economia:.0f}% a menos, "
+                    f"{depois / max(len(df), 1) * 1e6:.0f} MB por milhão de linhas).")
+    return df
+
+
+def _dicionario(origem: str, colunas: list = None) -> list:
+    """Colunas categóricas do artefato (entre as pedidas) a ler como dicionário do Parquet (read_dictionary)."""
+    existentes = pq.read_schema(origem, memory_map=True).names
+    return [c for c in COLUNAS_CATEGORICAS if c in existentes and (colunas is None or c in colunas)]
+
+
+def iterar(origem: str, colunas: list = None, tamanho_lote: int = 200000, compactar: bool = False,
+           strings_arrow: bool = True):
+    """Lê o artefato em lotes de `tamanho_lote` linhas, sem materializar o arquivo inteiro."""
+    dicionario = _dicionario(origem, colunas) if compactar else None
+    arquivo = pq.ParquetFile(origem, memory_map=True, read_dictionary=dicionario)
+    logger.info(f"Lendo {origem} em lotes de {tamanho_lote} linhas ({arquivo.metadata.num_rows} linhas no total).")
+    for lote in arquivo.iter_batches(batch_size=tamanho_lote, columns=colunas):
+        df = lote.to_pandas()
+        yield compacta(df, strings_arrow=strings_arrow) if compactar else df
+
+
+def abrir_escritor(nome: str, schema: pa.Schema, temp_dir: str = TEMP_DIR):
+    """Abre um ParquetWriter para gravar o artefato `nome` lote a lote; retorna (caminho, writer)."""
+    destino = caminho(nome, temp_dir)
+    return destino, pq.ParquetWriter(destino, schema)
+
+
+def escrever_lote(writer, df: pd.DataFrame) -> None:
+    """Anexa um lote ao artefato, convertendo para o schema fixo do writer.
+
+    Colunas category voltam a texto antes da conversão: o dicionário (e o tipo dos códigos)
+    muda de um lote para outro, e o schema do arquivo precisa ser o mesmo em todos.
+    """
+    categoricas = {c: object for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)}
+    if categoricas:
+        df = df.astype(categoricas)
+    writer.write_table(pa.Table.from_pandas(df, schema=writer.schema, preserve_index=False))
+
+
+def exportar_ipc(origem: str, colunas: list = None, compactar: bool = False, temp_dir: str = TEMP_DIR) -> str:
+    """Converte o artefato Parquet num arquivo Arrow IPC sem compressão, com a coluna `_linha`
+    (posição original de cada linha).
+
+    O IPC pode ser mapeado em memória por vários processos sem cópia nem pickle: todos leem os
+    mesmos buffers pelo cache de páginas do sistema operacional.
+    """
+    dicionario = _dicionario(origem, colunas) if compactar else None
+    tabela = pq.read_table(origem, columns=colunas, memory_map=True, read_dictionary=dicionario)
+    tabela = tabela.append_column('_linha', pa.array(range(tabela.num_rows), type=pa.int64()))
+
+    os.makedirs(temp_dir, exist_ok=True)
+    destino = os.path.join(temp_dir, os.path.splitext(os.path.basename(origem))[0] + '.arrow')
+    with pa.OSFile(destino, 'wb') as arquivo, ipc.new_file(arquivo, tabela.schema) as writer:
+        writer.write_table(tabela)
+    logger.info(f"Artefato {origem} exportado para IPC em {destino} ({tabela.num_rows} linhas).")
+    return destino
+
+
+def ler_ipc(origem: str) -> pa.Table:
+    """Abre o arquivo IPC mapeado em memória; as colunas apontam direto para os buffers do arquivo."""
+    return ipc.open_file(pa.memory_map(origem, 'r')).read_all()
+
+
+def carregar(origem: str, colunas: list = None, compactar: bool = False, strings_arrow: bool = True) -> pd.DataFrame:
+    """Lê o artefato mapeando o arquivo em memória e trazendo só as colunas pedidas.
+
+    Com `compactar`, as colunas categóricas já vêm como category direto do dicionário do Parquet.
+    """
+    dicionario = _dicionario(origem, colunas) if compactar else None
+    tabela = pq.read_table(origem, columns=colunas, memory_map=True, read_dictionary=dicionario)
+    logger.info(f"Artefato {origem} carregado ({tabela.num_rows} linhas, colunas={tabela.column_names}).")
+    df = tabela.to_pandas()
+
+    if compactar:
+        df = compacta(df, rotulo=os.path.basename(origem), strings_arrow=strings_arrow)
+    return df
@@ -0,0 +1,90 @@
+import io
+import os
+import logging
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+load_dotenv('/opt/airflow/.env')  # caminho absoluto no container Airflow
+
+# Configuração padrão, sobrescrevível pelo .env
+DB_CONFIG = {
+    'host': os.getenv("DB_HOST", 'postgres'),
+    'database': os.getenv("DB_NAME", 'vendas_db'),
+    'user': os.getenv("DB_USER", 'airflow'),
+    'password': os.getenv("DB_PASSWORD"),
+}
+POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX = int(os.getenv("DB_POOL_MAX", "4"))
+STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 = sem limite
+
+# Um pool por processo e configuração: processos filhos (fork) não herdam as conexões do pai
+_pools = {}
+
+
+def _config(**overrides) -> dict:
+    config = dict(DB_CONFIG)
+    config.update({k: v for k, v in overrides.items() if v is not None})
+    if not config['password']:
+        raise ValueError("Senha do banco de dados não foi definida no arquivo .env ou parâmetro")
+    return config
+
+
+def get_pool(**overrides) -> pool.ThreadedConnectionPool:
+    config = _config(**overrides)
+    chave = (os.getpid(),) + tuple(sorted(config.items()))
+    if chave not in _pools:
+        opcoes = f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"
+        _pools[chave] = pool.ThreadedConnectionPool(POOL_MIN, POOL_MAX, options=opcoes, **config)
+        logger.info(f"Pool de conexões criado para {config['user']}@{config['host']}/{config['database']} "
+                    f"(min={POOL_MIN}, max={POOL_MAX}, statement_timeout={STATEMENT_TIMEOUT_MS}ms).")
+    return _pools[chave]
+
+
+def _saudavel(conn) -> bool:
+    if conn.closed:
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def copy_dataframe(cur, df, tabela: str, colunas: list) -> None:
+    """Envia o DataFrame para a tabela com um único COPY FROM STDIN em formato CSV."""
+    buffer = io.StringIO()
+    df[colunas].to_csv(buffer, index=False, header=False, na_rep='')
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+
+
+@contextmanager
+def conexao(**overrides):
+    """Empresta uma conexão verificada do pool do processo e a devolve ao final.
+
+    Transações não confirmadas são desfeitas na devolução; quem grava chama `conn.commit()`.
+    """
+    pool_atual = get_pool(**overrides)
+    conn = pool_atual.getconn()
+    if not _saudavel(conn):
+        logger.warning("Conexão do pool inválida, abrindo uma nova.")
+        pool_atual.putconn(conn, close=True)
+        conn = pool_atual.getconn()
+
+    try:
+        yield conn
+    finally:
+        if not conn.closed:
+            conn.rollback()
+        pool_atual.putconn(conn, close=bool(conn.closed))
@@ -1,49 +1,192 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import codecs
+import glob
+import hashlib
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-import psycopg2
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 import logging
 from dotenv import load_dotenv
 
+import artefatos
+import db
+import watermark
+
 #Configuração do logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 #Carregando variáveis de ambiente
 load_dotenv('/opt/airflow/.env')  # caminho absoluto no container Airflow
-senha_db = os.getenv("DB_PASSWORD")
 
-if not senha_db:
-    raise ValueError("Senha não encontrada, verifique o arquivo .env")
+csv_dir = os.getenv("EXTRACT_CSV_DIR", '/opt/airflow/csv')  # caminho dentro do container
 
-csv_path = '/opt/airflow/csv/novas_vendas.csv'  # caminho dentro do container
+# Número de processos que gravam arquivos em paralelo (cada um com sua conexão)
+max_workers = int(os.getenv("EXTRACT_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
 
-def extract_data():
-    logger.info("Iniciando a extração de dados")
+# 'copy' usa COPY FROM STDIN (padrão); 'executemany' mantém o caminho antigo, linha a linha,
+# útil para comparar a vazão das duas cargas no log da task
+modo_carga = os.getenv("EXTRACT_MODO_CARGA", "copy")
 
-    if not os.path.exists(csv_path):
-        logger.warning(f"Arquivo CSV não encontrado em {csv_path}. Extração interrompida!")
-        return pd.DataFrame()
+# Quantidade de linhas do CSV lidas e gravadas por vez
+chunk_size = int(os.getenv("EXTRACT_CHUNK_SIZE", "100000"))
 
-    df = pd.read_csv(csv_path, encoding='latin1')
-    logger.info(f"Arquivo CSV carregado com {len(df)} linhas.")
-    logger.info(f"Exemplo dos dados CSV:\n{df.head()}")
+# 'pandas' (padrão, em blocos de chunk_size linhas) ou 'pyarrow' (leitor em streaming multithread,
+# em blocos de EXTRACT_PYARROW_BLOCK_MB). O leitor do Arrow lê cerca de 40 blocos à frente do que
+# já foi gravado, então a memória da leitura fica em torno de 40 x EXTRACT_PYARROW_BLOCK_MB
+csv_engine = os.getenv("EXTRACT_CSV_ENGINE", "pandas")
+pyarrow_block_mb = int(os.getenv("EXTRACT_PYARROW_BLOCK_MB", "8"))
 
-    try:
-        conn = psycopg2.connect(
-            host='postgres',
-            database='vendas_db',
-            user='airflow',
-            password=senha_db
+# Esquema declarado do arquivo de vendas: as colunas texto são lidas sem inferência
+# e as numéricas/datas convertidas explicitamente (valores sujos viram nulo)
+colunas_csv = ['nome', 'email', 'cidade', 'estado', 'id_cliente', 'data_venda', 'valor_venda', 'status_pedido']
+formato_data_venda = '%Y-%m-%d'
+
+# Linhas trazidas do cursor do servidor por vez na busca final
+itersize = int(os.getenv("EXTRACT_ITERSIZE", "50000"))
+
+# Nome do artefato de saída; o caminho é resolvido na chamada, dentro da pasta temporária escolhida
+NOME_SAIDA = 'df_extraido'
+
+# Esquema fixo do arquivo de saída, para que todos os lotes gravados sejam compatíveis
+schema_extraido = pa.schema([
+    ('id_cliente_raw', pa.int64()),
+    ('nome', pa.string()),
+    ('email', pa.string()),
+    ('cidade', pa.string()),
+    ('estado', pa.string()),
+    ('id_venda_raw', pa.int64()),
+    ('data_venda', pa.timestamp('us')),
+    ('valor_venda', pa.float64()),
+    ('status_pedido', pa.string()),
+])
+
+# Força a releitura da janela completa de 30 dias em vez da extração incremental
+def _booleano(valor) -> bool:
+    """Interpreta flags vindas de variável de ambiente ou do conf da DAG ("false" e "0" são falsos)."""
+    return str(valor).strip().lower() in ('1', 'true', 'sim')
+
+
+reprocessar_janela_padrao = _booleano(os.getenv("EXTRACT_REPROCESSAR_JANELA", "false"))
+
+
+def _inspeciona_arquivo(caminho: str) -> tuple:
+    """Na mesma leitura (blocos de 1 MB), calcula o SHA-256 e detecta se o arquivo é UTF-8 ou latin1."""
+    sha = hashlib.sha256()
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    utf8 = True
+    bom = None
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(bloco)
+            if bom is None:
+                bom = bloco.startswith(codecs.BOM_UTF8)
+            if utf8:
+                try:
+                    decoder.decode(bloco)
+                except UnicodeDecodeError:
+                    utf8 = False
+        if utf8:
+            try:
+                decoder.decode(b'', final=True)
+            except UnicodeDecodeError:
+                utf8 = False
+
+    encoding = ('utf-8-sig' if bom else 'utf-8') if utf8 else 'latin1'
+    return sha.hexdigest(), encoding
+
+
+def _tipa_bloco(df: pd.DataFrame, rotulo: str = None) -> pd.DataFrame:
+    """Aplica os tipos declarados às colunas numéricas e de data e a política de tipos compactos."""
+    df['id_cliente'] = pd.to_numeric(df['id_cliente'], errors='coerce').astype('Int64')
+    df['valor_venda'] = pd.to_numeric(df['valor_venda'], errors='coerce').astype('float64')
+    df['data_venda'] = pd.to_datetime(df['data_venda'], format=formato_data_venda, errors='coerce')
+    return artefatos.compacta(df, rotulo=rotulo, strings_arrow=False)
+
+
+def _le_csv(caminho: str, encoding: str):
+    """Gera o CSV em blocos já tipados, com o motor configurado em EXTRACT_CSV_ENGINE."""
+    if csv_engine == 'pyarrow':
+        leitor = pacsv.open_csv(
+            caminho,
+            read_options=pacsv.ReadOptions(encoding=encoding, block_size=pyarrow_block_mb * 1024 * 1024),
+            convert_options=pacsv.ConvertOptions(
+                include_columns=colunas_csv,
+                column_types={coluna: pa.string() for coluna in colunas_csv},
+                strings_can_be_null=True,  # campos vazios viram nulo, como no pandas
+            ),
         )
-        cur = conn.cursor()
-        logger.info("Conexão com o banco de dados estabelecida.")
-    except Exception as e:
-        logger.error(f"Erro ao conectar ao banco: {e}", exc_info=True)
-        return pd.DataFrame()
+        for num_lote, lote in enumerate(leitor):
+            yield _tipa_bloco(lote.to_pandas(), rotulo=caminho if num_lote == 0 else None)
+    else:
+        dtypes = {coluna: str for coluna in colunas_csv}
+        for num_bloco, bloco in enumerate(pd.read_csv(caminho, encoding=encoding, usecols=colunas_csv,
+                                                      dtype=dtypes, chunksize=chunk_size)):
+            yield _tipa_bloco(bloco, rotulo=caminho if num_bloco == 0 else None)
+
+
+def _hash_linhas(df: pd.DataFrame) -> pd.Series:
+    """MD5 de todas as colunas da linha do CSV; linhas idênticas são tratadas como a mesma venda."""
+    # Nulos viram '' antes do texto: astype(str) escreveria 'nan', 'None' ou '<NA>' conforme o
+    # motor de leitura e o dtype, e a mesma linha teria hashes diferentes entre pandas e pyarrow
+    partes = []
+    for coluna in sorted(df.columns):
+        valores = df[coluna]
+        if pd.api.types.is_datetime64_any_dtype(valores):
+            # Mesmo texto do str(Timestamp) (data_venda não tem fração de segundo), sem passar por objetos
+            valores = valores.dt.strftime('%Y-%m-%d %H:%M:%S')
+        valores = valores.astype(object)
+        partes.append(valores.where(valores.notna(), '').astype(str))
+    # str.cat junta as colunas de uma vez; um agg(axis=1) chamaria o join linha a linha
+    conteudo = partes[0].str.cat(partes[1:], sep='\x1f')
+    return conteudo.map(lambda linha: hashlib.md5(linha.encode('utf-8')).hexdigest())
+
 
+def _stage_clientes(cur, clientes_raw: pd.DataFrame) -> None:
+    """Carrega os clientes em uma tabela temporária e faz o upsert em clientes_raw de uma vez."""
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS tmp_clientes_raw (
+            ordem BIGINT,
+            nome TEXT,
+            email TEXT,
+            cidade TEXT,
+            estado TEXT,
+            flag_valid BOOLEAN
+        ) ON COMMIT DELETE ROWS
+    """)
+    stage = clientes_raw.reset_index(drop=True)
+    stage.insert(0, 'ordem', range(len(stage)))
+    db.copy_dataframe(cur, stage, 'tmp_clientes_raw', ['ordem', 'nome', 'email', 'cidade', 'estado', 'flag_valid'])
+
+    # Um mesmo email pode aparecer mais de uma vez no lote: como no executemany, vale a última linha.
+    # Emails nulos não conflitam com a constraint e são inseridos todos.
+    cur.execute("""
+        INSERT INTO clientes_raw (nome, email, cidade, estado, flag_valid)
+        SELECT nome, email, cidade, estado, flag_valid FROM (
+            SELECT DISTINCT ON (email) ordem, nome, email, cidade, estado, flag_valid
+            FROM tmp_clientes_raw
+            WHERE email IS NOT NULL
+            ORDER BY email, ordem DESC
+        ) ultimos
+        UNION ALL
+        SELECT nome, email, cidade, estado, flag_valid
+        FROM tmp_clientes_raw
+        WHERE email IS NULL
+        ON CONFLICT (email) DO UPDATE SET
+            nome = EXCLUDED.nome,
+            cidade = EXCLUDED.cidade,
+            estado = EXCLUDED.estado,
+            flag_valid = EXCLUDED.flag_valid
+    """)
+
+def _stage_chunk(cur, conn, df: pd.DataFrame) -> None:
+    """Grava um bloco do CSV em clientes_raw e vendas_raw, confirmando cada etapa."""
     # Processa clientes
     clientes_raw = df[['nome', 'email', 'cidade', 'estado']].drop_duplicates()
 
@@ -53,108 +196,313 @@ def extract_data():
     clientes_raw['flag_valid'] = clientes_raw['email'].apply(
         lambda x: False if pd.isna(x) or str(x).strip().lower() in ['nan', ''] else True
     )
-    logger.info(f"{len(clientes_raw)} clientes únicos extraídos do CSV.")
-
-    clientes_data = []
-    for idx, row in clientes_raw.iterrows():
-        clientes_data.append((
-            row['nome'],
-            row['email'],
-            row['cidade'],
-            row['estado'],
-            row['flag_valid']
-        ))
-        logger.debug(f"Cliente {idx}: {clientes_data[-1]}")
+    logger.info(f"{len(clientes_raw)} clientes únicos extraídos do bloco.")
 
     try:
-        cur.executemany("""
-            INSERT INTO clientes_raw (nome, email, cidade, estado, flag_valid)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (email) DO UPDATE SET
-                nome = EXCLUDED.nome,
-                cidade = EXCLUDED.cidade,
-                estado = EXCLUDED.estado,
-                flag_valid = EXCLUDED.flag_valid
-        """, clientes_data)
+        inicio = time.perf_counter()
+        if modo_carga == 'executemany':
+            clientes_data = list(clientes_raw[['nome', 'email', 'cidade', 'estado', 'flag_valid']]
+                                 .itertuples(index=False, name=None))
+            cur.executemany("""
+                INSERT INTO clientes_raw (nome, email, cidade, estado, flag_valid)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (email) DO UPDATE SET
+                    nome = EXCLUDED.nome,
+                    cidade = EXCLUDED.cidade,
+                    estado = EXCLUDED.estado,
+                    flag_valid = EXCLUDED.flag_valid
+            """, clientes_data)
+        else:
+            _stage_clientes(cur, clientes_raw)
         conn.commit()
-        logger.info(f"{len(clientes_data)} clientes inseridos/atualizados.")
+        duracao = time.perf_counter() - inicio
+        logger.info(f"{len(clientes_raw)} clientes inseridos/atualizados ({modo_carga}) em {duracao:.2f}s "
+                    f"({len(clientes_raw) / max(duracao, 1e-9):.0f} linhas/s).")
     except Exception as e:
         conn.rollback()
         logger.error(f"Erro ao inserir clientes_raw: {e}", exc_info=True)
-        cur.close()
-        conn.close()
-        return pd.DataFrame()
+        raise
 
     #Processa vendas
     vendas_raw = df[['email', 'data_venda', 'valor_venda', 'status_pedido']]
-    vendas_data = []
+    colunas_vendas = ['id_cliente_raw', 'data_venda', 'valor_venda', 'status_pedido', 'flag_valid', 'hash_linha']
 
-    for idx, row in vendas_raw.iterrows():
-        email = row['email']
-        id_cliente = None
+    # Resolve email → id_cliente_raw com uma única consulta para todos os emails do bloco
+    email_preenchido = vendas_raw['email'].notna() & (vendas_raw['email'].astype(str).str.strip() != '')
+    emails_lote = vendas_raw.loc[email_preenchido, 'email'].unique().tolist()
 
-        if pd.notna(email) and str(email).strip() != '':
-            cur.execute("SELECT id_cliente_raw FROM clientes_raw WHERE email = %s", (email,))
-            res = cur.fetchone()
-            if res:
-                id_cliente = res[0]
-            else:
-                logger.warning(f"Email {email} não encontrado em clientes_raw.")
-        else:
-            logger.warning(f"Linha {idx} tem email inválido ou vazio: '{email}'")
-
-        flag_valid = id_cliente is not None
-        vendas_data.append((
-            id_cliente,
-            row['data_venda'],
-            row['valor_venda'],
-            row['status_pedido'],
-            flag_valid
-        ))
-        logger.debug(f"Venda {idx}: {vendas_data[-1]}")
+    try:
+        cur.execute("SELECT email, id_cliente_raw FROM clientes_raw WHERE email = ANY(%s)", (emails_lote,))
+        id_map = dict(cur.fetchall())
+        logger.info(f"{len(id_map)} de {len(emails_lote)} emails do bloco resolvidos em clientes_raw.")
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao mapear emails em clientes_raw: {e}", exc_info=True)
+        raise
+
+    vendas_stage = vendas_raw[['data_venda', 'valor_venda', 'status_pedido']].copy()
+    vendas_stage.insert(0, 'id_cliente_raw', vendas_raw['email'].where(email_preenchido).map(id_map).astype('Int64'))
+    vendas_stage['flag_valid'] = vendas_stage['id_cliente_raw'].notna()
+    vendas_stage['hash_linha'] = _hash_linhas(df)
+    vendas_stage = vendas_stage[colunas_vendas]
+
+    qtd_sem_email = int((~email_preenchido).sum())
+    nao_encontrados = email_preenchido & ~vendas_stage['flag_valid']
+    if qtd_sem_email:
+        logger.warning(f"{qtd_sem_email} linhas têm email inválido ou vazio.")
+    if nao_encontrados.any():
+        exemplos = vendas_raw.loc[nao_encontrados, 'email'].unique()[:10].tolist()
+        logger.warning(f"{int(nao_encontrados.sum())} vendas com email não encontrado em clientes_raw. Exemplos: {exemplos}")
 
     try:
-        cur.executemany("""
-            INSERT INTO vendas_raw (id_cliente_raw, data_venda, valor_venda, status_pedido, flag_valid)
-            VALUES (%s, %s, %s, %s, %s)
-        """, vendas_data)
+        inicio = time.perf_counter()
+        if modo_carga == 'executemany':
+            vendas_data = list(vendas_stage.astype(object).where(vendas_stage.notna(), None)
+                               .itertuples(index=False, name=None))
+            cur.executemany("""
+                INSERT INTO vendas_raw (id_cliente_raw, data_venda, valor_venda, status_pedido, flag_valid, hash_linha)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON CONFLICT DO NOTHING
+            """, vendas_data)
+            inseridas = cur.rowcount  # no psycopg2, soma das linhas afetadas em todas as execuções
+        else:
+            # Vendas já vistas (mesmo hash_linha) são descartadas pelo índice único; sem alvo no ON CONFLICT,
+            # vale tanto para (hash_linha) quanto para (hash_linha, data_venda) da tabela particionada
+            cur.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS tmp_vendas_raw ON COMMIT DELETE ROWS AS
+                SELECT id_cliente_raw, data_venda, valor_venda, status_pedido, flag_valid, hash_linha
+                FROM vendas_raw WITH NO DATA
+            """)
+            db.copy_dataframe(cur, vendas_stage, 'tmp_vendas_raw', colunas_vendas)
+            cur.execute("""
+                INSERT INTO vendas_raw (id_cliente_raw, data_venda, valor_venda, status_pedido, flag_valid, hash_linha)
+                SELECT id_cliente_raw, data_venda, valor_venda, status_pedido, flag_valid, hash_linha
+                FROM tmp_vendas_raw
+                ON CONFLICT DO NOTHING
+            """)
+            inseridas = cur.rowcount
         conn.commit()
-        logger.info(f"{len(vendas_data)} vendas inseridas.")
+        duracao = time.perf_counter() - inicio
+        logger.info(f"{inseridas} vendas inseridas ({modo_carga}) em {duracao:.2f}s "
+                    f"({len(vendas_stage) / max(duracao, 1e-9):.0f} linhas/s); "
+                    f"{len(vendas_stage) - inseridas} já existiam e foram ignoradas.")
     except Exception as e:
         conn.rollback()
         logger.error(f"Erro ao inserir vendas_raw: {e}", exc_info=True)
-        cur.close()
-        conn.close()
-        return pd.DataFrame()
+        raise
+
+
+def _stage_arquivo(cur, conn, caminho: str, hash_arquivo: str, encoding: str) -> tuple:
+    """Grava o CSV bloco a bloco e registra o arquivo como ingerido.
 
-    # Busca dados recentes para transformação (últimos 30 dias)
+    Retorna o total de linhas e o tempo gasto só na leitura e tipagem do CSV.
+    """
+    # O CSV é lido em blocos e cada bloco é gravado antes de ler o próximo,
+    # então a memória usada depende do tamanho do bloco e não do arquivo
+    total_linhas = 0
+    segundos_leitura = 0.0
+    blocos = _le_csv(caminho, encoding)
     try:
+        num_bloco = 0
+        while True:
+            inicio_leitura = time.perf_counter()
+            bloco = next(blocos, None)
+            segundos_leitura += time.perf_counter() - inicio_leitura
+            if bloco is None:
+                break
+
+            num_bloco += 1
+            if num_bloco == 1:
+                logger.info(f"Exemplo dos dados de {caminho}:\n{bloco.head()}")
+            _stage_chunk(cur, conn, bloco)
+            total_linhas += len(bloco)
+            logger.info(f"{caminho}: bloco {num_bloco} gravado ({len(bloco)} linhas, {total_linhas} no total).")
+
         cur.execute("""
+            INSERT INTO arquivos_ingeridos (hash_arquivo, nome_arquivo, linhas)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (hash_arquivo) DO NOTHING
+        """, (hash_arquivo, os.path.basename(caminho), total_linhas))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Gravação de {caminho} interrompida após {total_linhas} linhas: {e}")
+        raise
+
+    return total_linhas, segundos_leitura
+
+
+def _ingere_arquivo(caminho: str) -> dict:
+    """Processa um arquivo do diretório de CSVs com conexão própria (roda dentro do pool)."""
+    inicio = time.perf_counter()
+    resultado = {'arquivo': caminho, 'linhas': 0, 'status': 'ok', 'erro': None}
+
+    try:
+        with db.conexao() as conn, conn.cursor() as cur:
+            # Arquivo já ingerido (mesmo conteúdo) não é gravado de novo, ex.: retry da task
+            hash_arquivo, encoding = _inspeciona_arquivo(caminho)
+            cur.execute("SELECT 1 FROM arquivos_ingeridos WHERE hash_arquivo = %s", (hash_arquivo,))
+            ja_ingerido = cur.fetchone() is not None
+            conn.commit()
+
+            if ja_ingerido:
+                resultado['status'] = 'ignorado'
+            else:
+                resultado['encoding'] = encoding
+                resultado['linhas'], resultado['segundos_leitura'] = _stage_arquivo(
+                    cur, conn, caminho, hash_arquivo, encoding
+                )
+    except Exception as e:
+        resultado.update(status='erro', erro=str(e))
+
+    resultado['segundos'] = time.perf_counter() - inicio
+    return resultado
+
+
+def _ingere_pendentes(arquivos: list) -> list:
+    """Distribui os arquivos entre processos; cai para execução sequencial se o pool não puder ser criado."""
+    if max_workers <= 1 or len(arquivos) <= 1:
+        return [_ingere_arquivo(caminho) for caminho in arquivos]
+
+    try:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(arquivos))) as pool:
+            return list(pool.map(_ingere_arquivo, arquivos))
+    except AssertionError as e:
+        # Processos daemônicos (ex.: worker Celery) não podem criar filhos
+        logger.warning(f"Pool de processos indisponível ({e}). Gravando arquivos sequencialmente.")
+        return [_ingere_arquivo(caminho) for caminho in arquivos]
+
+
+def _busca_lotes(conn, filtro: str, params):
+    """Lê o resultado com um cursor nomeado (do lado do servidor) e gera (lote Arrow, maior id_venda_raw do lote)."""
+    with conn.cursor(name='extract_stream') as cur:
+        cur.itersize = itersize
+        cur.execute(f"""
             SELECT v.id_cliente_raw, c.nome, c.email, c.cidade, c.estado,
-                   v.id_venda_raw, v.data_venda, v.valor_venda, v.status_pedido
+                   v.id_venda_raw, v.data_venda::timestamp AS data_venda,
+                   v.valor_venda::float8 AS valor_venda, v.status_pedido
             FROM vendas_raw v
             LEFT JOIN clientes_raw c ON v.id_cliente_raw = c.id_cliente_raw
-            WHERE v.data_venda >= NOW() - INTERVAL '30 days'
-        """)
-        rows = cur.fetchall()
-        colnames = [desc[0] for desc in cur.description]
-        df_new = pd.DataFrame(rows, columns=colnames)
-        logger.info(f"{len(df_new)} registros carregados para transformação.")
+            WHERE {filtro}
+        """, params)
+
+        while True:
+            rows = cur.fetchmany(itersize)
+            if not rows:
+                break
+            colunas = list(zip(*rows))
+            lote = pa.Table.from_arrays(
+                [pa.array(valores, type=campo.type) for valores, campo in zip(colunas, schema_extraido)],
+                schema=schema_extraido
+            )
+            yield lote, max(colunas[5])
+
+
+def _busca_para_arquivo(conn, filtro: str, params, destino: str) -> dict:
+    """Grava o resultado da busca lote a lote em Parquet."""
+    linhas = 0
+    ultimo_id = None
+    with pq.ParquetWriter(destino, schema_extraido) as writer:
+        for lote, maior_id_lote in _busca_lotes(conn, filtro, params):
+            writer.write_table(lote)
+            linhas += lote.num_rows
+            ultimo_id = maior_id_lote if ultimo_id is None else max(ultimo_id, maior_id_lote)
+
+        if linhas == 0:
+            writer.write_table(schema_extraido.empty_table())
+
+    return {'caminho': destino, 'linhas': linhas, 'ultimo_id_venda_raw': ultimo_id}
+
+
+def _busca_em_memoria(conn, filtro: str, params) -> dict:
+    """Junta os lotes da busca numa tabela Arrow, sem passar pelo disco."""
+    lotes = []
+    ultimo_id = None
+    for lote, maior_id_lote in _busca_lotes(conn, filtro, params):
+        lotes.append(lote)
+        ultimo_id = maior_id_lote if ultimo_id is None else max(ultimo_id, maior_id_lote)
+
+    tabela = pa.concat_tables(lotes) if lotes else schema_extraido.empty_table()
+    return {'caminho': None, 'tabela': tabela, 'linhas': tabela.num_rows, 'ultimo_id_venda_raw': ultimo_id}
+
+
+def _ingere_arquivos(arquivos: list) -> None:
+    """Grava os arquivos pendentes em staging e registra o resultado de cada um no log.
+
+    Se algum arquivo falhar, levanta RuntimeError depois do log: a task falha e o retry do
+    Airflow refaz a extração. Os arquivos com falha não foram marcados como ingeridos, então
+    são gravados de novo; os que deram certo são ignorados pelo hash.
+    """
+    logger.info(f"{len(arquivos)} arquivos encontrados em {csv_dir}; gravando com até {max_workers} processos.")
+    inicio = time.perf_counter()
+    resultados = _ingere_pendentes(arquivos)
+
+    for r in resultados:
+        if r['status'] == 'ok':
+            logger.info(f"{r['arquivo']} ({r['encoding']}, {csv_engine}): {r['linhas']} linhas gravadas em "
+                        f"{r['segundos']:.2f}s (leitura e tipagem: {r['segundos_leitura']:.2f}s).")
+        elif r['status'] == 'ignorado':
+            logger.info(f"{r['arquivo']}: já ingerido anteriormente, ignorado ({r['segundos']:.2f}s).")
+        else:
+            logger.error(f"{r['arquivo']}: falha na gravação: {r['erro']}")
+    logger.info(f"Ingestão dos arquivos concluída em {time.perf_counter() - inicio:.2f}s "
+                f"({sum(r['linhas'] for r in resultados)} linhas).")
+
+    falhas = [r['arquivo'] for r in resultados if r['status'] == 'erro']
+    if falhas:
+        raise RuntimeError(f"Falha na gravação de {len(falhas)} arquivo(s): {', '.join(falhas)}")
+
+
+def extract_data(reprocessar_janela: bool = False, temp_dir: str = artefatos.TEMP_DIR, em_memoria: bool = False) -> dict:
+    """Grava os arquivos pendentes em staging e exporta as vendas a transformar para df_extraido.parquet em `temp_dir`.
+
+    Com `em_memoria=True` nada é gravado em disco: o resultado fica na chave 'tabela' (tabela Arrow), para o runner local.
+    """
+    logger.info("Iniciando a extração de dados")
+    destino = None if em_memoria else artefatos.caminho(NOME_SAIDA, temp_dir)
+
+    arquivos = sorted(glob.glob(os.path.join(csv_dir, '*.csv')))
+    if arquivos:
+        _ingere_arquivos(arquivos)
+    else:
+        # Sem arquivos novos ainda pode haver vendas em vendas_raw não entregues a uma carga confirmada
+        logger.warning(f"Nenhum arquivo CSV encontrado em {csv_dir}; seguindo só com a busca em vendas_raw.")
+
+    # Incremental: só as vendas gravadas em vendas_raw depois da última carga bem-sucedida.
+    # Sem marca d'água (primeira execução) ou com reprocessamento forçado, relê os últimos 30 dias.
+    try:
+        with db.conexao() as conn:
+            ultimo_id = None if reprocessar_janela else watermark.ler_watermark(conn)
+            if ultimo_id is None:
+                logger.info("Buscando a janela completa dos últimos 30 dias.")
+                filtro, params = "v.data_venda >= NOW() - INTERVAL '30 days'", None
+            else:
+                logger.info(f"Extração incremental a partir de id_venda_raw > {ultimo_id}.")
+                filtro, params = "v.id_venda_raw > %s", (ultimo_id,)
+
+            if destino is None:
+                resultado = _busca_em_memoria(conn, filtro, params)
+            else:
+                resultado = _busca_para_arquivo(conn, filtro, params, destino)
+        logger.info(f"{resultado['linhas']} registros gravados em {destino or 'memória'} para transformação.")
     except Exception as e:
+        # Artefato vazio significa "nenhuma venda nova" para o validate; erro de banco tem que falhar a task
         logger.error(f"Erro ao buscar registros para transformação: {e}", exc_info=True)
-        df_new = pd.DataFrame()
-    finally:
-        cur.close()
-        conn.close()
+        raise
 
-    return df_new
+    return resultado
 
 
 #Função que será chamada pela DAG
 def main(**kwargs):
-    df = extract_data()
-    os.makedirs('/opt/airflow/temp', exist_ok=True)
-    output_path = '/opt/airflow/temp/df_extraido.pkl'
-    df.to_pickle(output_path)
-    logger.info(f"DataFrame salvo em {output_path}")
-    return output_path  # Usado via XCom na DAG
\ No newline at end of file
+    dag_run = kwargs.get('dag_run')
+    conf = (dag_run.conf or {}) if dag_run else {}
+    reprocessar_janela = _booleano(conf.get('reprocessar_janela', reprocessar_janela_padrao))
+
+    resultado = extract_data(reprocessar_janela=reprocessar_janela)
+    logger.info(f"Extração salva em {resultado['caminho']}")
+
+    # O load só avança a marca d'água depois de confirmar a carga
+    if 'ti' in kwargs and resultado['ultimo_id_venda_raw'] is not None:
+        kwargs['ti'].xcom_push(key='watermark', value=int(resultado['ultimo_id_venda_raw']))
+    return resultado['caminho']  # Usado via XCom na DAG
\ No newline at end of file
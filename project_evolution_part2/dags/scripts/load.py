@@ -1,69 +1,46 @@
 import os
 import logging
 import pandas as pd
-import psycopg2
-from dotenv import load_dotenv
 from datetime import date
+from dotenv import load_dotenv
+
+import artefatos
+import db
+import particionamento
+import watermark
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 load_dotenv('/opt/airflow/.env')
-senha_db = os.getenv("DB_PASSWORD")
 
-def load_banco(df_clientes: pd.DataFrame, df_vendas: pd.DataFrame) -> None:
-    logger.info("Iniciando a carga no banco de dados")
+# 'conjunto' aplica o SCD2 do lote com poucas instruções SQL; 'linha' mantém o caminho venda a venda
+modo_scd2 = os.getenv('LOAD_MODO_SCD2', 'conjunto').lower()
+# Vendas por transação; cada lote confirmado é registrado como checkpoint do run
+tamanho_lote = int(os.getenv('LOAD_TAMANHO_LOTE', '50000'))
+# Checkpoints de runs que falharam e nunca foram retomados são apagados depois deste prazo
+retencao_checkpoint_dias = int(os.getenv('LOAD_CHECKPOINT_RETENCAO_DIAS', '7'))
 
-    try:
-        conn = psycopg2.connect(
-            host='postgres',
-            database='vendas_db',
-            user='airflow',
-            password=senha_db
-        )
-        cur = conn.cursor()
-    except Exception as e:
-        logger.error(f"Erro ao conectar ao banco: {e}")
-        raise
+# Colunas dos artefatos do validate que a carga usa (o id_cliente é resolvido pelo email)
+COLUNAS_CLIENTES = ['nome', 'email', 'cidade', 'estado']
+COLUNAS_VENDAS = ['id_venda_raw', 'email', 'data_venda', 'valor_venda', 'status_pedido']
 
-    # CARGA DE CLIENTES
-    clientes = df_clientes[['nome', 'email', 'cidade', 'estado']]
-    clientes_data = [
-        (row['nome'], row['email'], row['cidade'], row['estado'])
-        for _, row in clientes.iterrows()
-    ]
 
-    try:
-        cur.executemany("""
-            INSERT INTO clientes (nome, email, cidade, estado)
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT (email) DO NOTHING
-        """, clientes_data)
-        conn.commit()
-        logger.info(f"{len(clientes_data)} clientes inseridos/atualizados.")
-    except Exception as e:
-        conn.rollback()
-        logger.error(f"Erro ao inserir clientes: {e}")
-        cur.close()
-        conn.close()
-        raise
+def _expr_hash_versao(status: str, valor: str, data: str) -> str:
+    """Expressão SQL do hash dos atributos versionados da venda (status, valor e data).
 
-    #Mapeamento email → id_cliente
-    try:
-        cur.execute("SELECT id_cliente, email FROM clientes")
-        rows = cur.fetchall()
-        id_map = {email: id_cliente for id_cliente, email in rows}
-        logger.info("Mapeamento email → id_cliente realizado.")
-    except Exception as e:
-        logger.error(f"Erro ao mapear IDs: {e}")
-        cur.close()
-        conn.close()
-        raise
+    Usa formas textuais fixas (valor com 2 casas, data em YYYY-MM-DD) para que o hash calculado a
+    partir dos parâmetros da carga e o das colunas gravadas sejam iguais, qualquer que seja o
+    tipo das colunas ou o DateStyle da sessão.
+    """
+    return (f"MD5(CONCAT_WS('|', COALESCE({status}::TEXT, ''), "
+            f"COALESCE(ROUND({valor}::NUMERIC, 2)::TEXT, ''), "
+            f"COALESCE(TO_CHAR({data}::DATE, 'YYYY-MM-DD'), '')))")
 
-    # CARGA DE VENDAS (SCD2)
-    df_vendas['id_cliente'] = df_vendas['email'].map(id_map)
-    df_vendas = df_vendas[df_vendas['id_cliente'].notna()]
 
+def _scd2_por_linha(cur, df_vendas: pd.DataFrame) -> None:
+    """SCD2 venda a venda: SELECT da versão atual e, se preciso, UPDATE + INSERT (três idas ao banco por linha)."""
+    expr_hash = _expr_hash_versao('%s', '%s', '%s')
     for _, row in df_vendas.iterrows():
         id_venda_raw = str(row.get('id_venda_raw')).strip()  # <- CONVERSÃO IMPORTANTE
         id_cliente = int(row['id_cliente'])
@@ -72,48 +49,264 @@ def load_banco(df_clientes: pd.DataFrame, df_vendas: pd.DataFrame) -> None:
         status_pedido = row['status_pedido']
         valid_from = date.today()
 
-        # Verifica se já existe versão atual da venda
-        cur.execute("""
-            SELECT status_pedido FROM vendas
+        # Verifica se já existe versão atual da venda e se o hash dos atributos versionados mudou
+        cur.execute(f"""
+            SELECT hash_versao, {expr_hash} FROM vendas
             WHERE id_venda_raw = %s AND is_current = TRUE
-        """, (id_venda_raw,))
+        """, (status_pedido, valor_venda, data_venda, id_venda_raw))
         result = cur.fetchone()
 
         if result is None:
             # Nova venda
-            cur.execute("""
-                INSERT INTO vendas (id_cliente, data_venda, valor_venda, status_pedido, 
-                                    id_venda_raw, valid_from, valid_to, is_current)
-                VALUES (%s, %s, %s, %s, %s, %s, NULL, TRUE)
-            """, (id_cliente, data_venda, valor_venda, status_pedido, id_venda_raw, valid_from))
+            cur.execute(f"""
+                INSERT INTO vendas (id_cliente, data_venda, valor_venda, status_pedido,
+                                    id_venda_raw, valid_from, valid_to, is_current, hash_versao)
+                VALUES (%s, %s, %s, %s, %s, %s, NULL, TRUE, {expr_hash})
+            """, (id_cliente, data_venda, valor_venda, status_pedido, id_venda_raw, valid_from,
+                  status_pedido, valor_venda, data_venda))
             logger.info(f"Venda nova inserida: {id_venda_raw}")
-        elif result[0] != status_pedido:
+        elif result[0] != result[1]:
             # Atualiza versão antiga e insere nova
             cur.execute("""
                 UPDATE vendas
                 SET valid_to = %s, is_current = FALSE
                 WHERE id_venda_raw = %s AND is_current = TRUE
             """, (valid_from, id_venda_raw))
-            cur.execute("""
-                INSERT INTO vendas (id_cliente, data_venda, valor_venda, status_pedido, 
-                                    id_venda_raw, valid_from, valid_to, is_current)
-                VALUES (%s, %s, %s, %s, %s, %s, NULL, TRUE)
-            """, (id_cliente, data_venda, valor_venda, status_pedido, id_venda_raw, valid_from))
-            logger.info(f"Venda atualizada (novo status): {id_venda_raw}")
+            cur.execute(f"""
+                INSERT INTO vendas (id_cliente, data_venda, valor_venda, status_pedido,
+                                    id_venda_raw, valid_from, valid_to, is_current, hash_versao)
+                VALUES (%s, %s, %s, %s, %s, %s, NULL, TRUE, {expr_hash})
+            """, (id_cliente, data_venda, valor_venda, status_pedido, id_venda_raw, valid_from,
+                  status_pedido, valor_venda, data_venda))
+            logger.info(f"Venda atualizada (status, valor ou data): {id_venda_raw}")
         else:
             logger.info(f"Venda já existente e atual: {id_venda_raw} (sem mudanças)")
 
-    conn.commit()
-    cur.close()
-    conn.close()
-    logger.info("Carga de vendas finalizada.")
+
+def _scd2_em_conjunto(cur, df_vendas: pd.DataFrame) -> None:
+    """SCD2 do lote inteiro com COPY para staging, um UPDATE ... FROM e um INSERT ... SELECT.
+
+    Reproduz o resultado de _scd2_por_linha, inclusive quando a mesma venda aparece várias vezes
+    no lote: cada linha é comparada com a anterior da mesma venda (a primeira, com a versão atual
+    no banco) pelo hash dos atributos versionados e só vira versão nova se o hash mudou. Das versões criadas, só a última fica atual;
+    as intermediárias já nascem fechadas, como ficariam após o processamento linha a linha.
+    """
+    valid_from = date.today()
+
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS tmp_vendas_scd2 ON COMMIT DELETE ROWS AS
+        SELECT 0::BIGINT AS ordem, id_cliente, data_venda, valor_venda, status_pedido, id_venda_raw
+        FROM vendas WITH NO DATA
+    """)
+    stage = df_vendas[['id_cliente', 'data_venda', 'valor_venda', 'status_pedido', 'id_venda_raw']].reset_index(drop=True)
+    stage.insert(0, 'ordem', range(len(stage)))
+    db.copy_dataframe(cur, stage, 'tmp_vendas_scd2',
+                      ['ordem', 'id_cliente', 'data_venda', 'valor_venda', 'status_pedido', 'id_venda_raw'])
+
+    cur.execute(f"""
+        CREATE TEMP TABLE tmp_vendas_scd2_versoes ON COMMIT DROP AS
+        WITH com_hash AS (
+            SELECT t.*, {_expr_hash_versao('t.status_pedido', 't.valor_venda', 't.data_venda')} AS hash_versao
+            FROM tmp_vendas_scd2 t
+        ),
+        sequencia AS (
+            SELECT h.*,
+                   ROW_NUMBER() OVER (PARTITION BY h.id_venda_raw ORDER BY h.ordem) AS posicao,
+                   LAG(h.hash_versao) OVER (PARTITION BY h.id_venda_raw ORDER BY h.ordem) AS hash_anterior
+            FROM com_hash h
+        ),
+        mudancas AS (
+            SELECT s.*, a.id_venda_raw IS NULL AND s.posicao = 1 AS nova
+            FROM sequencia s
+            LEFT JOIN vendas a ON a.id_venda_raw = s.id_venda_raw AND a.is_current = TRUE
+            WHERE CASE WHEN s.posicao = 1
+                       THEN a.id_venda_raw IS NULL OR a.hash_versao IS DISTINCT FROM s.hash_versao
+                       ELSE s.hash_anterior IS DISTINCT FROM s.hash_versao
+                  END
+        )
+        SELECT m.*,
+               ROW_NUMBER() OVER (PARTITION BY m.id_venda_raw ORDER BY m.ordem DESC) = 1 AS ultima
+        FROM mudancas m
+    """)
+
+    # Fecha a versão atual das vendas que ganharam versão nova
+    cur.execute("""
+        UPDATE vendas v
+        SET valid_to = %s, is_current = FALSE
+        FROM (SELECT DISTINCT id_venda_raw FROM tmp_vendas_scd2_versoes) m
+        WHERE v.id_venda_raw = m.id_venda_raw AND v.is_current = TRUE
+    """, (valid_from,))
+    fechadas = cur.rowcount
+
+    cur.execute("""
+        INSERT INTO vendas (id_cliente, data_venda, valor_venda, status_pedido,
+                            id_venda_raw, valid_from, valid_to, is_current, hash_versao)
+        SELECT id_cliente, data_venda, valor_venda, status_pedido, id_venda_raw,
+               %s, CASE WHEN ultima THEN NULL ELSE %s::DATE END, ultima, hash_versao
+        FROM tmp_vendas_scd2_versoes
+        ORDER BY ordem
+    """, (valid_from, valid_from))
+    inseridas = cur.rowcount
+
+    cur.execute("SELECT COUNT(*) FILTER (WHERE nova) FROM tmp_vendas_scd2_versoes")
+    novas = cur.fetchone()[0]
+    logger.info(f"{inseridas} versões inseridas ({novas} vendas novas, {fechadas} versões fechadas); "
+                f"{len(stage) - inseridas} linhas sem mudanças.")
+
+
+def _identidade_lote(lote: pd.DataFrame) -> tuple:
+    """(linhas, menor id_venda_raw, maior id_venda_raw) do lote, comparados com o checkpoint antes de pulá-lo."""
+    ids = lote['id_venda_raw'].dropna().astype(str)
+    if ids.empty:
+        return len(lote), None, None
+    # Mesma ordenação numérica da extração incremental (id_venda_raw é SERIAL em vendas_raw)
+    ordenados = sorted(ids.unique(), key=lambda i: (len(i), i))
+    return len(lote), ordenados[0], ordenados[-1]
+
+
+def _limpa_checkpoints_orfaos(cur) -> None:
+    cur.execute("""
+        DELETE FROM carga_checkpoint WHERE confirmado_em < NOW() - %s * INTERVAL '1 day'
+    """, (retencao_checkpoint_dias,))
+    if cur.rowcount:
+        logger.info(f"{cur.rowcount} checkpoints de carga com mais de {retencao_checkpoint_dias} dias removidos.")
+
+
+def _lotes_concluidos(cur, run_id: str, artefato: str, total_vendas: int) -> dict:
+    """Checkpoints do run que ainda valem: lote -> (linhas, menor id, maior id).
+
+    Se a tentativa anterior usou outro artefato, outro total de vendas ou outro tamanho de lote,
+    a numeração dos lotes não corresponde mais e os checkpoints do run são descartados: a carga
+    recomeça do primeiro lote (o SCD2 não cria versão nova para venda sem mudança).
+    """
+    cur.execute("""
+        SELECT lote, linhas, id_venda_raw_min, id_venda_raw_max, artefato, total_vendas, tamanho_lote
+        FROM carga_checkpoint WHERE run_id = %s
+    """, (run_id,))
+    checkpoints = cur.fetchall()
+    atual = (artefato, total_vendas, tamanho_lote)
+    if any((art, total, tamanho) != atual for _, _, _, _, art, total, tamanho in checkpoints):
+        logger.warning(f"Checkpoints do run {run_id} gravados com outro artefato, total de vendas ou tamanho de lote "
+                       f"(agora {atual}); a carga recomeça do primeiro lote.")
+        cur.execute("DELETE FROM carga_checkpoint WHERE run_id = %s", (run_id,))
+        return {}
+    return {lote: (linhas, minimo, maximo) for lote, linhas, minimo, maximo, _, _, _ in checkpoints}
+
+
+def _carrega_lote_vendas(cur, df_vendas: pd.DataFrame) -> None:
+    """Resolve o id_cliente e aplica o SCD2 a um lote de vendas, sem confirmar a transação."""
+    #Mapeamento email → id_cliente, só para os emails das vendas do lote (usa o índice único de email)
+    emails_lote = df_vendas['email'].dropna().unique().tolist()
+    try:
+        cur.execute("SELECT email, id_cliente FROM clientes WHERE email = ANY(%s)", (emails_lote,))
+        id_map = dict(cur.fetchall())
+        logger.info(f"Mapeamento email → id_cliente realizado ({len(id_map)} de {len(emails_lote)} emails do lote).")
+    except Exception as e:
+        logger.error(f"Erro ao mapear IDs: {e}")
+        raise
+
+    # CARGA DE VENDAS (SCD2)
+    df_vendas = df_vendas.assign(id_cliente=df_vendas['email'].map(id_map))
+    df_vendas = df_vendas[df_vendas['id_cliente'].notna()].astype({'id_cliente': 'int64'})
+
+    if modo_scd2 == 'linha':
+        _scd2_por_linha(cur, df_vendas)
+    else:
+        _scd2_em_conjunto(cur, df_vendas)
+
+
+def load_banco(df_clientes: pd.DataFrame, df_vendas: pd.DataFrame, run_id: str = None, artefato: str = None) -> None:
+    """Carrega clientes e vendas; as vendas são confirmadas em lotes de `tamanho_lote` linhas.
+
+    Com `run_id`, cada lote confirmado fica registrado em carga_checkpoint junto com a sua
+    identidade (artefato de origem, total de vendas, tamanho do lote, linhas e faixa de
+    id_venda_raw). Uma nova tentativa do mesmo run só pula o lote se a identidade for a mesma;
+    caso contrário, o lote é carregado de novo.
+    """
+    logger.info("Iniciando a carga no banco de dados")
+
+    with db.conexao() as conn, conn.cursor() as cur:
+        # CARGA DE CLIENTES
+        clientes = df_clientes[['nome', 'email', 'cidade', 'estado']]
+        # Nulos (NaN, NA ou categoria ausente) viram None: o psycopg2 gravaria NaN como o texto 'NaN'
+        clientes = clientes.astype(object).where(clientes.notna(), None)
+        clientes_data = list(clientes.itertuples(index=False, name=None))
+
+        try:
+            cur.executemany("""
+                INSERT INTO clientes (nome, email, cidade, estado)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (email) DO NOTHING
+            """, clientes_data)
+            conn.commit()
+            logger.info(f"{len(clientes_data)} clientes inseridos/atualizados.")
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Erro ao inserir clientes: {e}")
+            raise
+
+        # CARGA DE VENDAS (SCD2), em lotes confirmados um a um
+        particionamento.cria_particoes_futuras(cur)
+        _limpa_checkpoints_orfaos(cur)
+        concluidos = _lotes_concluidos(cur, run_id, artefato, len(df_vendas)) if run_id else {}
+        conn.commit()
+        if concluidos:
+            logger.info(f"Retomando a carga do run {run_id}: {len(concluidos)} lotes já confirmados.")
+
+        for numero, inicio in enumerate(range(0, len(df_vendas), tamanho_lote)):
+            lote = df_vendas.iloc[inicio:inicio + tamanho_lote]
+            identidade = _identidade_lote(lote)
+            if numero in concluidos:
+                if concluidos[numero] == identidade:
+                    logger.info(f"Lote {numero} já confirmado neste run; pulado.")
+                    continue
+                logger.warning(f"Lote {numero} do checkpoint {concluidos[numero]} difere do lote atual {identidade}; "
+                               f"carregando de novo.")
+            try:
+                _carrega_lote_vendas(cur, lote)
+                # O checkpoint entra na mesma transação do lote: ou os dois são confirmados, ou nenhum
+                if run_id:
+                    cur.execute("""
+                        INSERT INTO carga_checkpoint (run_id, lote, linhas, id_venda_raw_min, id_venda_raw_max,
+                                                      artefato, total_vendas, tamanho_lote)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                        ON CONFLICT (run_id, lote) DO UPDATE
+                        SET linhas = EXCLUDED.linhas, id_venda_raw_min = EXCLUDED.id_venda_raw_min,
+                            id_venda_raw_max = EXCLUDED.id_venda_raw_max, confirmado_em = NOW()
+                    """, (run_id, numero, *identidade, artefato, len(df_vendas), tamanho_lote))
+                conn.commit()
+                logger.info(f"Lote {numero} confirmado ({inicio + len(lote)} de {len(df_vendas)} vendas).")
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Erro ao carregar o lote {numero} de vendas: {e}", exc_info=True)
+                raise
+
+        if run_id:
+            cur.execute("DELETE FROM carga_checkpoint WHERE run_id = %s", (run_id,))
+            conn.commit()
+        logger.info("Carga de vendas finalizada.")
+
+
+def avanca_watermark(ultimo_id_venda_raw) -> None:
+    """Avança a marca d'água da extração incremental; chamar só depois da carga confirmada."""
+    if ultimo_id_venda_raw is not None:
+        with db.conexao() as conn:
+            watermark.salvar_watermark(conn, int(ultimo_id_venda_raw))
+
 
 def main(ti):
-    clientes_path = ti.xcom_pull(task_ids='validate_data')['clientes']
-    vendas_path = ti.xcom_pull(task_ids='validate_data')['vendas']
+    caminhos = ti.xcom_pull(task_ids='validate_data')
+    if not caminhos:
+        logger.info("Validação não gerou artefatos (nenhuma venda nova); carga pulada.")
+        return
+
+    clientes_path = caminhos['clientes']
+    vendas_path = caminhos['vendas']
+
+    clientes = artefatos.carregar(clientes_path, colunas=COLUNAS_CLIENTES, compactar=True)
+    vendas = artefatos.carregar(vendas_path, colunas=COLUNAS_VENDAS, compactar=True)
 
-    clientes = pd.read_pickle(clientes_path)
-    vendas = pd.read_pickle(vendas_path)
+    load_banco(clientes, vendas, run_id=getattr(ti, 'run_id', None), artefato=vendas_path)
+    logger.info("Carga concluída com sucesso.")
 
-    load_banco(clientes, vendas)
-    logger.info("Carga concluída com sucesso.")
\ No newline at end of file
+    avanca_watermark(ti.xcom_pull(task_ids='extract_data', key='watermark'))
\ No newline at end of file
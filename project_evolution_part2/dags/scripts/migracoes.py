@@ -0,0 +1,203 @@
+import logging
+
+import db
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Migrações versionadas do banco, aplicadas em ordem no início do pipeline. Cada versão roda
+# uma única vez, na sua própria transação, e fica registrada em schema_migracoes.
+# Nunca altere uma versão já publicada: mudanças novas entram como uma versão nova no fim da lista.
+# As instruções usam IF NOT EXISTS para também servirem a bancos criados antes deste módulo.
+MIGRACOES = [
+    (1, 'esquema base das camadas raw e cleansed', [
+        """
+        CREATE TABLE IF NOT EXISTS clientes_raw (
+            id_cliente_raw SERIAL PRIMARY KEY,
+            nome TEXT,
+            email TEXT CONSTRAINT unique_email UNIQUE,
+            cidade TEXT,
+            estado TEXT,
+            flag_valid BOOLEAN
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS vendas_raw (
+            id_venda_raw SERIAL PRIMARY KEY,
+            id_cliente_raw INTEGER,
+            data_venda DATE,
+            valor_venda NUMERIC(12, 2),
+            status_pedido TEXT,
+            flag_valid BOOLEAN
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS clientes (
+            id_cliente SERIAL PRIMARY KEY,
+            nome TEXT,
+            email TEXT UNIQUE,
+            cidade TEXT,
+            estado TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS vendas (
+            id_venda SERIAL PRIMARY KEY,
+            id_cliente INTEGER REFERENCES clientes (id_cliente),
+            data_venda DATE,
+            valor_venda NUMERIC(12, 2),
+            status_pedido TEXT
+        )
+        """,
+    ]),
+    # DDL do SCD2 descrito em error/parte4_scd2.md
+    (2, 'colunas e índice do SCD2 em vendas', [
+        "ALTER TABLE vendas ADD COLUMN IF NOT EXISTS id_venda_raw TEXT",
+        "ALTER TABLE vendas ADD COLUMN IF NOT EXISTS valid_from DATE NOT NULL DEFAULT CURRENT_DATE",
+        "ALTER TABLE vendas ADD COLUMN IF NOT EXISTS valid_to DATE",
+        "ALTER TABLE vendas ADD COLUMN IF NOT EXISTS is_current BOOLEAN DEFAULT true",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_venda_raw_current ON vendas (id_venda_raw) WHERE is_current = TRUE",
+    ]),
+    (3, 'índices das consultas de extract, load e analise_gera_csv', [
+        # extract: email -> id_cliente_raw do bloco, respondido só pelo índice
+        "CREATE INDEX IF NOT EXISTS idx_clientes_raw_email_id ON clientes_raw (email) INCLUDE (id_cliente_raw)",
+        # extract: janela de 30 dias da primeira execução ou de reprocessamento
+        "CREATE INDEX IF NOT EXISTS idx_vendas_raw_data_venda ON vendas_raw (data_venda)",
+        # load: email -> id_cliente das vendas do lote
+        "CREATE INDEX IF NOT EXISTS idx_clientes_email_id ON clientes (email) INCLUDE (id_cliente)",
+        # analise: top 10 por receita (entregues) e pedidos atrasados, ambos filtrando por data_venda
+        """
+        CREATE INDEX IF NOT EXISTS idx_vendas_entregue_data ON vendas (data_venda)
+        INCLUDE (id_cliente, valor_venda, id_venda) WHERE status_pedido = 'entregue'
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_vendas_atrasado_data ON vendas (data_venda)
+        INCLUDE (id_cliente, id_venda) WHERE status_pedido = 'atrasado'
+        """,
+    ]),
+    # Tabelas e colunas de controle que antes cada módulo criava na primeira execução
+    (4, 'controle de ingestão: arquivos ingeridos e impressão digital das linhas de vendas_raw', [
+        """
+        CREATE TABLE IF NOT EXISTS arquivos_ingeridos (
+            hash_arquivo TEXT PRIMARY KEY,
+            nome_arquivo TEXT NOT NULL,
+            linhas BIGINT NOT NULL,
+            ingerido_em TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+        """,
+        "ALTER TABLE vendas_raw ADD COLUMN IF NOT EXISTS hash_linha TEXT",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_vendas_raw_hash_linha ON vendas_raw (hash_linha)",
+    ]),
+    (5, "marca d'água da extração incremental", [
+        """
+        CREATE TABLE IF NOT EXISTS etl_watermark (
+            pipeline TEXT PRIMARY KEY,
+            ultimo_id_venda_raw BIGINT NOT NULL,
+            atualizado_em TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+        """,
+    ]),
+    (6, 'checkpoints dos lotes confirmados da carga de vendas', [
+        """
+        CREATE TABLE IF NOT EXISTS carga_checkpoint (
+            run_id TEXT NOT NULL,
+            lote INTEGER NOT NULL,
+            linhas INTEGER NOT NULL,
+            confirmado_em TIMESTAMP NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (run_id, lote)
+        )
+        """,
+    ]),
+    (7, 'quarentena de registros rejeitados no banco', [
+        """
+        CREATE TABLE IF NOT EXISTS rejeitados (
+            id BIGSERIAL PRIMARY KEY,
+            run_id TEXT NOT NULL,
+            entidade TEXT NOT NULL,
+            regras_violadas TEXT,
+            registro JSONB,
+            quarentenado_em TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_rejeitados_run ON rejeitados (run_id, entidade)",
+    ]),
+    (8, 'hash dos atributos versionados das vendas (SCD2)', [
+        "ALTER TABLE vendas ADD COLUMN IF NOT EXISTS hash_versao TEXT",
+        # Mesma expressão de load._expr_hash_versao, escrita por extenso para a versão não mudar com o código
+        """
+        UPDATE vendas
+        SET hash_versao = MD5(CONCAT_WS('|', COALESCE(status_pedido::TEXT, ''),
+                                        COALESCE(ROUND(valor_venda::NUMERIC, 2)::TEXT, ''),
+                                        COALESCE(TO_CHAR(data_venda::DATE, 'YYYY-MM-DD'), '')))
+        WHERE is_current = TRUE AND hash_versao IS NULL
+        """,
+        # A comparação de hash das versões atuais é resolvida só pelo índice
+        "CREATE INDEX IF NOT EXISTS idx_vendas_raw_current_hash ON vendas (id_venda_raw, is_current) INCLUDE (hash_versao)",
+    ]),
+    # Só (run_id, lote) não basta para pular um lote na retomada: o artefato pode ter sido refeito
+    # ou o tamanho do lote pode ter mudado entre as tentativas
+    (9, 'identidade dos lotes nos checkpoints da carga', [
+        "ALTER TABLE carga_checkpoint ADD COLUMN IF NOT EXISTS artefato TEXT",
+        "ALTER TABLE carga_checkpoint ADD COLUMN IF NOT EXISTS total_vendas BIGINT",
+        "ALTER TABLE carga_checkpoint ADD COLUMN IF NOT EXISTS tamanho_lote INTEGER",
+        "ALTER TABLE carga_checkpoint ADD COLUMN IF NOT EXISTS id_venda_raw_min TEXT",
+        "ALTER TABLE carga_checkpoint ADD COLUMN IF NOT EXISTS id_venda_raw_max TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_carga_checkpoint_confirmado ON carga_checkpoint (confirmado_em)",
+    ]),
+]
+
+# Chave do advisory lock que impede duas execuções aplicando migrações ao mesmo tempo
+_LOCK_MIGRACOES = 7420251
+
+
+def _garante_tabela(cur) -> None:
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migracoes (
+            versao INTEGER PRIMARY KEY,
+            descricao TEXT NOT NULL,
+            aplicada_em TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+
+
+def versao_atual(cur) -> int:
+    _garante_tabela(cur)
+    cur.execute("SELECT COALESCE(MAX(versao), 0) FROM schema_migracoes")
+    return cur.fetchone()[0]
+
+
+def aplicar(host: str = None, database: str = None, user: str = None, password: str = None) -> int:
+    """Aplica as migrações pendentes e retorna a versão final do esquema.
+
+    Os parâmetros são nomeados (sem **kwargs) porque a função é o python_callable da task
+    aplicar_migracoes: o PythonOperator repassaria o contexto inteiro da execução para um **kwargs.
+    """
+    with db.conexao(host=host, database=database, user=user, password=password) as conn, conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (_LOCK_MIGRACOES,))
+        try:
+            atual = versao_atual(cur)
+            conn.commit()
+            for versao, descricao, instrucoes in MIGRACOES:
+                if versao <= atual:
+                    continue
+                try:
+                    for sql in instrucoes:
+                        cur.execute(sql)
+                    cur.execute("INSERT INTO schema_migracoes (versao, descricao) VALUES (%s, %s)", (versao, descricao))
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"Erro ao aplicar a migração {versao} ({descricao}): {e}", exc_info=True)
+                    raise
+                logger.info(f"Migração {versao} aplicada: {descricao}.")
+                atual = versao
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (_LOCK_MIGRACOES,))
+            conn.commit()
+
+    logger.info(f"Esquema do banco na versão {atual}.")
+    return atual
+
+
+if __name__ == "__main__":
+    aplicar()
@@ -0,0 +1,82 @@
+import os
+import logging
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Limite de valores memorizados por coluna; o cache dura o processo inteiro, atravessando os lotes
+cache_max = int(os.getenv('NORMALIZACAO_CACHE_MAX', '100000'))
+
+_caches = {}
+
+
+def sem_acentos(texto: str) -> str:
+    """Remove acentos e cedilha ("concluído" -> "concluido")."""
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def _normaliza_unicos(valores: np.ndarray, nome: str, funcao) -> np.ndarray:
+    """Aplica `funcao` a cada valor distinto, consultando antes o LRU da coluna `nome`."""
+    if len(valores) > cache_max:
+        # Mais distintos que o cache comporta: cada consulta expulsaria uma entrada ainda útil
+        return np.array([funcao(valor) for valor in valores], dtype=object)
+
+    cache = _caches.setdefault(nome, OrderedDict())
+    saida = np.empty(len(valores), dtype=object)
+    for i, valor in enumerate(valores):
+        if valor in cache:
+            cache.move_to_end(valor)
+            saida[i] = cache[valor]
+        else:
+            resultado = funcao(valor)
+            cache[valor] = resultado
+            if len(cache) > cache_max:
+                cache.popitem(last=False)
+            saida[i] = resultado
+    return saida
+
+
+def normaliza(serie: pd.Series, nome: str, funcao, preenche: str = None) -> pd.Series:
+    """Normaliza só os valores distintos da série e devolve o resultado para todas as linhas.
+
+    `funcao` recebe um texto e retorna o valor normalizado (None quando não há correspondência).
+    Nulos recebem `funcao(preenche)` ou continuam nulos quando `preenche` é None. Numa coluna
+    category o trabalho é feito direto nas categorias e o retorno continua category.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos = serie.cat.codes.to_numpy()
+        unicos = serie.cat.categories.to_numpy(dtype=object)
+    else:
+        codigos, unicos = pd.factorize(serie)
+        unicos = np.asarray(unicos, dtype=object)
+
+    normalizados = _normaliza_unicos(unicos, nome, lambda valor: funcao(str(valor)))
+    nulo = funcao(preenche) if preenche is not None else np.nan
+    # O código -1 (nulo) aponta para o último elemento
+    valores = np.append(normalizados, np.array([nulo], dtype=object))
+
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Categorias que normalizam para o mesmo valor ("SP " e "SP") são fundidas só nos códigos
+        novos_codigos, categorias = pd.factorize(pd.Series(valores, dtype=object), sort=True)
+        return pd.Series(pd.Categorical.from_codes(novos_codigos[codigos], categories=categorias), index=serie.index)
+
+    try:
+        # A expansão para todas as linhas é um take do Arrow: montar a Series a partir de um array
+        # object custaria mais que o próprio .str linha a linha
+        texto = pa.array(valores, type=pa.string(), from_pandas=True)
+        resultado = texto.take(pa.array(codigos % len(valores))).to_pandas()
+        resultado.index = serie.index
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # `funcao` devolveu algo que não é texto
+        resultado = pd.Series(valores[codigos], index=serie.index)
+    return resultado
+
+
+def limpa_caches() -> None:
+    _caches.clear()
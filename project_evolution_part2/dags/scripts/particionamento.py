@@ -0,0 +1,275 @@
+import os
+import re
+import json
+import logging
+import argparse
+from datetime import date
+from dotenv import load_dotenv
+
+import db
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+load_dotenv('/opt/airflow/.env')
+
+# Tabelas particionadas por mês de data_venda
+TABELAS = ['vendas', 'vendas_raw']
+COLUNA_PARTICAO = 'data_venda'
+# Quantos meses à frente devem ter partição pronta
+meses_futuros = int(os.getenv('PARTICOES_MESES_FUTUROS', '3'))
+
+
+
+def _mes(dia: date, deslocamento: int = 0) -> date:
+    """Primeiro dia do mês de `dia`, deslocado em `deslocamento` meses."""
+    total = dia.year * 12 + dia.month - 1 + deslocamento
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def particionada(cur, tabela: str) -> bool:
+    cur.execute("""
+        SELECT 1 FROM pg_partitioned_table p
+        JOIN pg_class c ON c.oid = p.partrelid
+        WHERE c.relname = %s AND pg_table_is_visible(c.oid)
+    """, (tabela,))
+    return cur.fetchone() is not None
+
+
+def cria_particao(cur, tabela: str, inicio: date) -> str:
+    """Cria (se ainda não existir) a partição do mês que começa em `inicio`.
+
+    Vendas com data além dos meses já preparados caem na partição default, e o Postgres recusa
+    criar a partição de um mês que já tem linhas na default. Nesse caso a default é desanexada,
+    a partição é criada, as linhas do mês passam para ela e a default volta a ser anexada.
+    """
+    nome = f"{tabela}_p{inicio:%Y_%m}"
+    fim = _mes(inicio, 1)
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL, to_regclass(%s) IS NOT NULL", (nome, f"{tabela}_default"))
+    existe, tem_default = cur.fetchone()
+    if existe:
+        return nome
+
+    pendentes = False
+    if tem_default:
+        cur.execute(f"""
+            SELECT EXISTS (SELECT 1 FROM {tabela}_default WHERE {COLUNA_PARTICAO} >= %s AND {COLUNA_PARTICAO} < %s)
+        """, (inicio, fim))
+        pendentes = cur.fetchone()[0]
+    if pendentes:
+        cur.execute(f"ALTER TABLE {tabela} DETACH PARTITION {tabela}_default")
+    cur.execute(f"""
+        CREATE TABLE {nome} PARTITION OF {tabela}
+        FOR VALUES FROM ('{inicio:%Y-%m-%d}') TO ('{fim:%Y-%m-%d}')
+    """)
+    if pendentes:
+        cur.execute(f"""
+            WITH movidas AS (
+                DELETE FROM {tabela}_default WHERE {COLUNA_PARTICAO} >= %s AND {COLUNA_PARTICAO} < %s RETURNING *
+            )
+            INSERT INTO {nome} SELECT * FROM movidas
+        """, (inicio, fim))
+        logger.info(f"{cur.rowcount} linhas de {inicio:%Y-%m} movidas de {tabela}_default para {nome}.")
+        cur.execute(f"ALTER TABLE {tabela} ATTACH PARTITION {tabela}_default DEFAULT")
+    return nome
+
+
+def cria_particoes_futuras(cur, meses: int = meses_futuros) -> None:
+    """Garante as partições do mês corrente e dos `meses` seguintes nas tabelas já particionadas."""
+    hoje = date.today()
+    for tabela in TABELAS:
+        if not particionada(cur, tabela):
+            continue
+        for deslocamento in range(meses + 1):
+            cria_particao(cur, tabela, _mes(hoje, deslocamento))
+
+
+def _colunas_pk(cur, tabela: str) -> list:
+    cur.execute("""
+        SELECT a.attname
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = %s::regclass AND i.indisprimary
+        ORDER BY array_position(i.indkey::int2[], a.attnum)
+    """, (tabela,))
+    return [coluna for (coluna,) in cur.fetchall()]
+
+
+def _indices(cur, tabela: str) -> list:
+    """(nome, definição, único) dos índices de `tabela` que não são a chave primária."""
+    cur.execute("""
+        SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisunique
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = %s::regclass AND NOT i.indisprimary
+        ORDER BY c.relname
+    """, (tabela,))
+    return cur.fetchall()
+
+
+def _indice_particionado(definicao: str, tabela: str, unico: bool) -> str:
+    """Adapta a definição de um índice de `tabela` (pg_get_indexdef) à tabela particionada.
+
+    Em tabela particionada todo índice único precisa conter a chave de partição, então
+    data_venda entra no fim das colunas-chave dos únicos que ainda não a têm.
+    """
+    definicao = re.sub(rf' ON (?:\S+\.)?"?{tabela}"? USING ', f' ON {tabela} USING ', definicao, count=1)
+    if not unico:
+        return definicao
+    # Colunas-chave: primeiro grupo entre parênteses depois do método de acesso
+    abre = definicao.index('(', definicao.index(' USING '))
+    nivel = 0
+    for posicao in range(abre, len(definicao)):
+        nivel += {'(': 1, ')': -1}.get(definicao[posicao], 0)
+        if nivel == 0:
+            break
+    chaves = [coluna.strip().strip('"') for coluna in definicao[abre + 1:posicao].split(',')]
+    if COLUNA_PARTICAO in chaves:
+        return definicao
+    return f"{definicao[:posicao]}, {COLUNA_PARTICAO}{definicao[posicao:]}"
+
+
+def migra_tabela(cur, tabela: str, meses: int = meses_futuros) -> None:
+    """Converte `tabela` em tabela particionada por mês de data_venda.
+
+    A tabela original é renomeada para <tabela>_legado (com seus índices) e mantida para
+    conferência; os dados são copiados para as partições mensais, e linhas sem data_venda
+    vão para a partição default. As sequências passam a pertencer à nova tabela e todos os
+    índices da original são recriados a partir das suas definições.
+    """
+    legado = f"{tabela}_legado"
+    pk = _colunas_pk(cur, tabela)
+
+    cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s AND schemaname = current_schema()", (tabela,))
+    indices_antigos = [nome for (nome,) in cur.fetchall()]
+    indices = _indices(cur, tabela)
+    cur.execute("""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype = 'f'
+    """, (tabela,))
+    chaves_estrangeiras = cur.fetchall()
+
+    cur.execute(f"ALTER TABLE {tabela} RENAME TO {legado}")
+    # Nomes de índice são únicos no schema: os antigos ganham sufixo para liberar os nomes
+    for nome in indices_antigos:
+        cur.execute(f"ALTER INDEX {nome} RENAME TO {nome}_legado")
+
+    cur.execute(f"""
+        CREATE TABLE {tabela} (LIKE {legado} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+        PARTITION BY RANGE ({COLUNA_PARTICAO})
+    """)
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {tabela}_default PARTITION OF {tabela} DEFAULT")
+
+    # Sequências dos ids (serial) seguem a nova tabela, para não serem apagadas com o legado
+    cur.execute("""
+        SELECT a.attname, pg_get_serial_sequence(%s, a.attname)
+        FROM pg_attribute a
+        WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+    """, (legado, legado))
+    for coluna, sequencia in cur.fetchall():
+        if sequencia:
+            cur.execute(f"ALTER SEQUENCE {sequencia} OWNED BY {tabela}.{coluna}")
+
+    cur.execute(f"SELECT MIN({COLUNA_PARTICAO})::DATE FROM {legado}")
+    menor = cur.fetchone()[0] or date.today()
+    inicio, fim = _mes(menor), _mes(date.today(), meses)
+    while inicio <= fim:
+        cria_particao(cur, tabela, inicio)
+        inicio = _mes(inicio, 1)
+
+    cur.execute(f"INSERT INTO {tabela} SELECT * FROM {legado}")
+    logger.info(f"{cur.rowcount} linhas copiadas de {legado} para {tabela} particionada.")
+
+    if pk:
+        # A chave primária vira índice único com data_venda (linhas sem data ficam na default)
+        colunas = ', '.join(pk + [COLUNA_PARTICAO] if COLUNA_PARTICAO not in pk else pk)
+        cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{tabela}_pk ON {tabela} ({colunas})")
+    for nome, definicao, unico in indices:
+        original = _indice_particionado(definicao, tabela, False)
+        particionado = _indice_particionado(definicao, tabela, unico)
+        cur.execute(particionado)
+        if particionado != original:
+            # Com data_venda na chave, linhas sem data nunca conflitam (NULL é distinto de NULL e o
+            # Postgres 13 não tem NULLS NOT DISTINCT). Todas elas ficam na default, que mantém a
+            # unicidade original num índice só dela; o ON CONFLICT sem alvo do extract também o usa.
+            cur.execute(original.replace(f"INDEX {nome} ON {tabela} ", f"INDEX {nome}_default ON {tabela}_default ", 1))
+    for nome, definicao in chaves_estrangeiras:
+        cur.execute(f"ALTER TABLE {tabela} ADD CONSTRAINT {nome} {definicao}")
+
+
+def migrar(meses: int = meses_futuros) -> None:
+    """Particiona vendas e vendas_raw numa única transação; tabelas já particionadas são ignoradas."""
+    with db.conexao() as conn, conn.cursor() as cur:
+        try:
+            for tabela in TABELAS:
+                if particionada(cur, tabela):
+                    logger.info(f"{tabela} já é particionada; nada a migrar.")
+                    continue
+                migra_tabela(cur, tabela, meses)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Erro ao particionar as tabelas: {e}", exc_info=True)
+            raise
+
+
+def manter(meses: int = meses_futuros) -> None:
+    with db.conexao() as conn, conn.cursor() as cur:
+        cria_particoes_futuras(cur, meses)
+        conn.commit()
+    logger.info(f"Partições garantidas até {_mes(date.today(), meses):%Y-%m}.")
+
+
+def _relacoes_lidas(plano: dict) -> list:
+    """Nomes das tabelas lidas em todos os nós de um plano EXPLAIN (FORMAT JSON)."""
+    lidas = [plano['Relation Name']] if 'Relation Name' in plano else []
+    for filho in plano.get('Plans', []):
+        lidas.extend(_relacoes_lidas(filho))
+    return lidas
+
+
+def verificar() -> dict:
+    """Roda EXPLAIN nas consultas do relatório e confere se só as partições recentes de vendas são lidas.
+
+    Retorna as partições lidas por consulta; levanta RuntimeError se alguma consulta lê todas.
+    """
+    import analise_gera_csv
+
+    consultas = {
+        'top_10_clientes': analise_gera_csv.sql_top_10_clientes(),
+        'atraso_clientes': analise_gera_csv.sql_atraso_clientes(),
+    }
+    resultado = {}
+    with db.conexao() as conn, conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM pg_inherits WHERE inhparent = 'vendas'::regclass")
+        total = cur.fetchone()[0]
+        for nome, sql in consultas.items():
+            cur.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+            plano = cur.fetchone()[0]
+            plano = plano if isinstance(plano, list) else json.loads(plano)
+            lidas = sorted({r for r in _relacoes_lidas(plano[0]['Plan']) if r.startswith('vendas_p') or r == 'vendas_default'})
+            resultado[nome] = lidas
+            if total and len(lidas) < total:
+                logger.info(f"{nome}: poda ativa, {len(lidas)} de {total} partições lidas ({', '.join(lidas)}).")
+            else:
+                logger.warning(f"{nome}: sem poda de partições ({len(lidas)} de {total} lidas).")
+
+    sem_poda = [nome for nome, lidas in resultado.items() if not total or len(lidas) >= total]
+    if sem_poda:
+        raise RuntimeError(f"Consultas do relatório sem poda de partições: {', '.join(sem_poda)}")
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Particionamento mensal de vendas e vendas_raw por data_venda.")
+    parser.add_argument('acao', choices=['migrar', 'manter', 'verificar'],
+                        help="migrar: converte as tabelas; manter: cria partições futuras; verificar: EXPLAIN do relatório.")
+    parser.add_argument('--meses', type=int, default=meses_futuros, help="Meses à frente com partição pronta.")
+    args = parser.parse_args()
+
+    if args.acao == 'migrar':
+        migrar(args.meses)
+    elif args.acao == 'manter':
+        manter(args.meses)
+    else:
+        verificar()
@@ -0,0 +1,150 @@
+"""Executa o pipeline inteiro num único processo, sem Airflow.
+
+Aplica as migrações pendentes e encadeia extract -> validate -> load -> run_analysis ->
+generate_pdf_report -> send_report passando os DataFrames em memória, sem arquivos intermediários
+nem XCom. Pensado para execuções avulsas e de recuperação; com --checkpoints os artefatos
+intermediários também são gravados em disco. Com --comparar-dag, os mesmos dados passam depois
+pelas gravações e leituras de Parquet que a DAG faz entre as tasks, para medir o custo de
+serialização que a execução em processo evita.
+
+Uso:
+    python pipeline_local.py [--reprocessar-janela] [--checkpoints] [--sem-email] [--temp-dir DIR] [--comparar-dag]
+"""
+import argparse
+import logging
+import tempfile
+import time
+
+import pyarrow.parquet as pq
+
+import artefatos
+import migracoes
+import extract
+import validate
+import load
+import quarentena
+import analise_gera_csv
+import gera_relatorio_pdf
+import send_report
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def mede_serializacao_dag(extraido, particoes: dict) -> dict:
+    """Refaz, com os dados já em memória, os artefatos que a DAG passa entre as tasks e mede cada etapa.
+
+    extract grava df_extraido.parquet, validate o lê e grava clientes_validos e vendas_validas,
+    e load lê os dois; o XCom só leva os caminhos. Os arquivos ficam numa pasta temporária.
+    """
+    tempos = {}
+    with tempfile.TemporaryDirectory(prefix='comparar_dag_') as pasta:
+        inicio = time.perf_counter()
+        origem = artefatos.caminho('df_extraido', pasta)
+        pq.write_table(extraido, origem)
+        tempos['extract_grava'] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        artefatos.carregar(origem, colunas=validate.COLUNAS_ENTRADA, compactar=True, strings_arrow=False)
+        tempos['validate_le'] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        caminhos = {nome: artefatos.salvar(particoes[nome], nome, pasta) for nome in ['clientes_validos', 'vendas_validas']}
+        tempos['validate_grava'] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        artefatos.carregar(caminhos['clientes_validos'], colunas=load.COLUNAS_CLIENTES, compactar=True)
+        artefatos.carregar(caminhos['vendas_validas'], colunas=load.COLUNAS_VENDAS, compactar=True)
+        tempos['load_le'] = time.perf_counter() - inicio
+    return tempos
+
+
+def run_pipeline(reprocessar_janela: bool = False, checkpoints: bool = False, enviar_email: bool = True,
+                 temp_dir: str = artefatos.TEMP_DIR, comparar_dag: bool = False) -> dict:
+    """Roda todas as etapas em sequência e retorna o tempo de cada uma, em segundos.
+
+    Com `comparar_dag` (só sem checkpoints), o retorno traz também 'serializacao_dag': o tempo que
+    a DAG gastaria a mais gravando e lendo os artefatos entre as tasks, fora do 'total'.
+    """
+    tempos = {}
+    run_id = quarentena.run_id_padrao()
+
+    inicio = time.perf_counter()
+    migracoes.aplicar()
+    tempos['migracoes'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    if checkpoints:
+        resultado = extract.extract_data(reprocessar_janela=reprocessar_janela, temp_dir=temp_dir)
+        df = artefatos.carregar(resultado['caminho'], colunas=validate.COLUNAS_ENTRADA, compactar=True, strings_arrow=False)
+    else:
+        resultado = extract.extract_data(reprocessar_janela=reprocessar_janela, em_memoria=True)
+        df = artefatos.compacta(resultado['tabela'].to_pandas(), strings_arrow=False)
+    tempos['extract'] = time.perf_counter() - inicio
+
+    # Sem vendas novas desde a última carga: pula validate e load, como a DAG
+    if df.empty:
+        logger.info("Nenhuma venda nova no extraído; validação e carga puladas.")
+    else:
+        inicio = time.perf_counter()
+        particoes = validate.clean_and_validate(df)
+        quarentena.quarentena(particoes['clientes_invalidos'], 'clientes', validate.IDS_REGRAS_CLIENTES, run_id)
+        quarentena.quarentena(particoes['vendas_invalidas'], 'vendas', validate.IDS_REGRAS_VENDAS, run_id)
+        if checkpoints:
+            for nome in ['clientes_validos', 'vendas_validas']:
+                artefatos.salvar(particoes[nome], nome, temp_dir)
+        tempos['validate'] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        load.load_banco(particoes['clientes_validos'][load.COLUNAS_CLIENTES], particoes['vendas_validas'][load.COLUNAS_VENDAS],
+                        run_id=run_id)
+        load.avanca_watermark(resultado['ultimo_id_venda_raw'])
+        tempos['load'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    analise_gera_csv.run_analysis(temp_dir=temp_dir)
+    tempos['analise'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    gera_relatorio_pdf.generate_pdf_report(temp_dir=temp_dir)
+    tempos['relatorio_pdf'] = time.perf_counter() - inicio
+
+    if enviar_email:
+        inicio = time.perf_counter()
+        send_report.send_report(temp_dir=temp_dir)
+        tempos['send_report'] = time.perf_counter() - inicio
+
+    tempos['total'] = sum(tempos.values())
+    resumo = ', '.join(f"{etapa}={segundos:.2f}s" for etapa, segundos in tempos.items())
+    # Para comparar com a DAG, some as durações das tasks equivalentes na UI do Airflow
+    logger.info(f"Pipeline local concluído ({'com' if checkpoints else 'sem'} checkpoints): {resumo}")
+
+    if comparar_dag and not checkpoints and not df.empty:
+        serializacao = mede_serializacao_dag(resultado['tabela'], particoes)
+        tempos['serializacao_dag'] = sum(serializacao.values())
+        detalhe = ', '.join(f"{etapa}={segundos:.2f}s" for etapa, segundos in serializacao.items())
+        # Agendamento e início de cada task não entram: veja o intervalo entre as tasks na UI do Airflow
+        logger.info(f"Caminho da DAG: +{tempos['serializacao_dag']:.2f}s de artefatos Parquet entre as tasks "
+                    f"({tempos['serializacao_dag'] / tempos['total'] * 100:.0f}% do pipeline em processo): {detalhe}")
+    return tempos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa o pipeline de e-commerce num único processo.")
+    parser.add_argument('--reprocessar-janela', action='store_true', help="Relê a janela de 30 dias ignorando a marca d'água.")
+    parser.add_argument('--checkpoints', action='store_true', help="Grava também os artefatos intermediários em disco.")
+    parser.add_argument('--sem-email', action='store_true', help="Não envia o relatório por e-mail.")
+    parser.add_argument('--temp-dir', default=artefatos.TEMP_DIR, help="Pasta dos CSVs, gráficos e PDF gerados.")
+    parser.add_argument('--comparar-dag', action='store_true',
+                        help="Mede também a gravação e leitura dos artefatos que a DAG faz entre as tasks.")
+    args = parser.parse_args()
+    if args.comparar_dag and args.checkpoints:
+        parser.error("--comparar-dag mede o que a execução em memória evita; não use junto com --checkpoints")
+
+    run_pipeline(
+        reprocessar_janela=args.reprocessar_janela,
+        checkpoints=args.checkpoints,
+        enviar_email=not args.sem_email,
+        temp_dir=args.temp_dir,
+        comparar_dag=args.comparar_dag,
+    )
@@ -0,0 +1,98 @@
+import os
+import re
+import logging
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+
+import db
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+load_dotenv('/opt/airflow/.env')
+
+# 'arquivo' grava Parquet por execução; 'tabela' envia para a tabela rejeitados no banco
+destino_padrao = os.getenv('QUARENTENA_DESTINO', 'arquivo').lower()
+quarentena_dir = os.getenv('QUARENTENA_DIR', '/opt/airflow/quarentena')
+
+
+def run_id_padrao() -> str:
+    """Identificador da execução quando a task não recebe o run_id do Airflow."""
+    return datetime.now().strftime('manual__%Y%m%dT%H%M%S')
+
+
+def regras_violadas(df: pd.DataFrame, ids_regras: list) -> pd.Series:
+    """Lista, por linha, os ids das regras reprovadas (colunas de flag False), separados por vírgula."""
+    violadas = pd.Series('', index=df.index, dtype=object)
+    for id_regra in ids_regras:
+        if id_regra in df.columns:
+            violadas = violadas + (~df[id_regra].astype(bool)).map({True: f'{id_regra},', False: ''})
+    return violadas.str.rstrip(',')
+
+
+def _prepara(df: pd.DataFrame, entidade: str, ids_regras: list, run_id: str) -> pd.DataFrame:
+    """Troca as colunas de flag por regras_violadas e acrescenta a identificação da execução."""
+    registros = df.drop(columns=[c for c in ids_regras if c in df.columns])
+    registros.insert(0, 'regras_violadas', regras_violadas(df, ids_regras))
+    registros.insert(0, 'entidade', entidade)
+    registros.insert(0, 'run_id', run_id)
+    registros['quarentenado_em'] = pd.Timestamp.now()
+    return registros
+
+
+def _grava_arquivo(registros: pd.DataFrame, entidade: str, run_id: str, parte: int = None) -> str:
+    pasta = os.path.join(quarentena_dir, entidade)
+    os.makedirs(pasta, exist_ok=True)
+    # run_id do Airflow traz ':' e '+', que não são seguros em nome de arquivo
+    nome = f"run_id={re.sub(r'[^0-9A-Za-z_.-]', '_', run_id)}"
+    if parte is not None:
+        nome += f"-parte={parte:05d}"
+    destino = os.path.join(pasta, f"{nome}.parquet")
+    pq.write_table(pa.Table.from_pandas(registros, preserve_index=False), destino)
+    return destino
+
+
+def _grava_tabela(registros: pd.DataFrame, entidade: str, run_id: str) -> str:
+    colunas_registro = [c for c in registros.columns if c not in ('run_id', 'entidade', 'regras_violadas', 'quarentenado_em')]
+    stage = registros[['run_id', 'entidade', 'regras_violadas']].copy()
+    # Cada linha vira um documento JSON, serializado em lote pelo pandas
+    stage['registro'] = registros[colunas_registro].to_json(orient='records', lines=True, date_format='iso').splitlines()
+
+    with db.conexao() as conn, conn.cursor() as cur:
+        db.copy_dataframe(cur, stage, 'rejeitados', ['run_id', 'entidade', 'regras_violadas', 'registro'])
+        conn.commit()
+    return f"rejeitados (run_id={run_id}, entidade={entidade})"
+
+
+def resumo(df: pd.DataFrame, ids_regras: list) -> dict:
+    """Contagem de reprovações por regra, para o log agregado."""
+    return {id_regra: int((~df[id_regra].astype(bool)).sum()) for id_regra in ids_regras if id_regra in df.columns}
+
+
+def quarentena(df: pd.DataFrame, entidade: str, ids_regras: list, run_id: str = None, destino: str = None,
+               parte: int = None):
+    """Grava em lote as linhas rejeitadas de `entidade`, com as regras violadas e o run_id.
+
+    Na validação em lotes, `parte` numera os arquivos da mesma execução para não sobrescrevê-los.
+    Retorna onde os registros foram gravados (caminho do Parquet ou referência à tabela),
+    ou None quando não há rejeitados.
+    """
+    if df.empty:
+        return None
+
+    run_id = run_id or run_id_padrao()
+    destino = (destino or destino_padrao).lower()
+    registros = _prepara(df, entidade, ids_regras, run_id)
+
+    if destino == 'tabela':
+        local = _grava_tabela(registros, entidade, run_id)
+    elif destino == 'arquivo':
+        local = _grava_arquivo(registros, entidade, run_id, parte)
+    else:
+        raise ValueError(f"Destino de quarentena desconhecido: {destino}")
+
+    logger.warning(f"{len(registros)} {entidade} rejeitados em quarentena: {local} - falhas por regra: {resumo(df, ids_regras)}")
+    return local
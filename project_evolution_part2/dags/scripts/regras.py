@@ -0,0 +1,122 @@
+import re
+import logging
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Motor de regras declarativas: cada regra é um dict com 'id', 'tipo' e 'coluna', mais os
+# parâmetros do tipo. As regras são compiladas uma vez em funções que devolvem máscaras
+# booleanas (True = linha aprovada), avaliadas de forma vetorizada sobre o DataFrame inteiro.
+#
+# Tipos suportados:
+#   not_null  -> valor não nulo
+#   regex     -> 'padrao' encontrado no valor (mesma semântica do re.search)
+#   range     -> 'min' <= valor <= 'max' (qualquer limite pode ser omitido)
+#   dtype     -> dtype da coluna igual a 'dtype' (regra de coluna: aprova ou reprova todas as linhas)
+#   in_set    -> valor em 'valores' ou no conjunto contexto['conjunto'] (ex.: chave estrangeira)
+#
+# 'permite_nulo': True faz regex/range/in_set aprovarem nulos, como no Great Expectations.
+
+
+def _not_null(regra):
+    coluna = regra['coluna']
+    return lambda df, contexto: df[coluna].notna()
+
+
+def _regex(regra):
+    coluna = regra['coluna']
+    padrao = re.compile(regra['padrao']).pattern  # compila já para acusar padrão inválido
+    permite_nulo = regra.get('permite_nulo', False)
+
+    def mascara(df, contexto):
+        serie = df[coluna]
+        aprovados = serie.astype(str).str.contains(padrao, regex=True, na=False) & serie.notna()
+        return aprovados | serie.isna() if permite_nulo else aprovados
+    return mascara
+
+
+def _range(regra):
+    coluna = regra['coluna']
+    minimo, maximo = regra.get('min'), regra.get('max')
+    permite_nulo = regra.get('permite_nulo', False)
+
+    def mascara(df, contexto):
+        serie = df[coluna]
+        aprovados = serie.notna()
+        if minimo is not None:
+            aprovados &= serie >= minimo
+        if maximo is not None:
+            aprovados &= serie <= maximo
+        return aprovados | serie.isna() if permite_nulo else aprovados
+    return mascara
+
+
+def _dtype(regra):
+    coluna = regra['coluna']
+    esperado = regra['dtype']
+
+    def mascara(df, contexto):
+        return pd.Series(str(df[coluna].dtype) == esperado, index=df.index)
+    return mascara
+
+
+def _in_set(regra):
+    coluna = regra['coluna']
+    fixos = regra.get('valores')
+    chave_contexto = regra.get('conjunto')
+    permite_nulo = regra.get('permite_nulo', False)
+
+    def mascara(df, contexto):
+        valores = fixos if fixos is not None else contexto[chave_contexto]
+        serie = df[coluna]
+        # isin aprova um nulo quando o conjunto também tem um; nulo só passa com permite_nulo
+        aprovados = serie.notna() & serie.isin(valores)
+        return aprovados | serie.isna() if permite_nulo else aprovados
+    return mascara
+
+
+_COMPILADORES = {
+    'not_null': _not_null,
+    'regex': _regex,
+    'range': _range,
+    'dtype': _dtype,
+    'in_set': _in_set,
+}
+
+
+def compila(regras: list) -> list:
+    """Transforma as regras declarativas em pares (id, função de máscara)."""
+    compiladas = []
+    for regra in regras:
+        if regra['tipo'] not in _COMPILADORES:
+            raise ValueError(f"Tipo de regra desconhecido: {regra['tipo']} (regra {regra['id']})")
+        compiladas.append((regra['id'], _COMPILADORES[regra['tipo']](regra)))
+    return compiladas
+
+
+def avalia(df: pd.DataFrame, regras: list, contexto: dict = None, amostra: int = 0) -> dict:
+    """Avalia as regras (declarativas ou já compiladas) numa única passada.
+
+    Retorna 'valido' (máscara de linhas aprovadas em todas as regras), 'mascaras' (por regra),
+    'falhas' (contagem de reprovações por regra) e, com `amostra` > 0, 'amostras' com até
+    `amostra` linhas reprovadas por regra.
+    """
+    compiladas = regras if regras and isinstance(regras[0], tuple) else compila(regras)
+    contexto = contexto or {}
+
+    valido = pd.Series(True, index=df.index)
+    mascaras, falhas, amostras = {}, {}, {}
+    for id_regra, funcao in compiladas:
+        mascara = funcao(df, contexto).astype(bool)
+        mascaras[id_regra] = mascara
+        falhas[id_regra] = int((~mascara).sum())
+        valido &= mascara
+        if amostra and falhas[id_regra]:
+            reprovadas = df[~mascara]
+            amostras[id_regra] = reprovadas.sample(min(amostra, len(reprovadas)), random_state=0)
+
+    if any(falhas.values()):
+        logger.info(f"Falhas por regra: {falhas}")
+
+    return {'valido': valido, 'mascaras': mascaras, 'falhas': falhas, 'amostras': amostras}
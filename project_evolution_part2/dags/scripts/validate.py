@@ -1,40 +1,137 @@
 import os
 import logging
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 
+import artefatos
+import normalizacao
+import quarentena
+import regras
+
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 load_dotenv('/opt/airflow/.env')  # Se precisar usar variáveis de ambiente
 
-def validate_data(df: pd.DataFrame) -> (pd.DataFrame, pd.DataFrame):
-    logger.info("Iniciando validação dos dados...")
+# 'memoria' valida o extraído inteiro de uma vez; 'lotes' valida lote a lote, para entradas maiores que a RAM
+modo_validacao = os.getenv('VALIDATE_MODO', 'memoria').lower()
+tamanho_lote = int(os.getenv('VALIDATE_TAMANHO_LOTE', '200000'))
+# Validação em paralelo por partição de cliente; abaixo de min_linhas_paralelo o custo do pool não compensa
+max_workers = int(os.getenv('VALIDATE_MAX_WORKERS', str(min(4, os.cpu_count() or 1))))
+min_linhas_paralelo = int(os.getenv('VALIDATE_MIN_LINHAS_PARALELO', '200000'))
+
+# Colunas do arquivo extraído que a validação realmente usa
+COLUNAS_ENTRADA = ['id_cliente_raw', 'nome', 'email', 'cidade', 'estado',
+                   'id_venda_raw', 'data_venda', 'valor_venda', 'status_pedido']
+
+# Regras de qualidade (ver regras.py); o id de cada regra vira a coluna de flag no resultado
+REGRAS_CLIENTES = regras.compila([
+    {'id': 'email_valido', 'tipo': 'regex', 'coluna': 'email', 'padrao': '@'},
+    {'id': 'nome_valido', 'tipo': 'regex', 'coluna': 'nome', 'padrao': r'\S'},
+])
+REGRAS_VENDAS = regras.compila([
+    {'id': 'status_valido', 'tipo': 'not_null', 'coluna': 'status_pedido'},
+    {'id': 'data_venda_valida', 'tipo': 'not_null', 'coluna': 'data_venda'},
+    {'id': 'valor_venda_valido', 'tipo': 'range', 'coluna': 'valor_venda', 'min': 0},
+    {'id': 'cliente_valido', 'tipo': 'in_set', 'coluna': 'id_cliente_raw', 'conjunto': 'clientes_validos_ids'},
+])
+IDS_REGRAS_CLIENTES = [id_regra for id_regra, _ in REGRAS_CLIENTES]
+IDS_REGRAS_VENDAS = [id_regra for id_regra, _ in REGRAS_VENDAS]
+
+# Schemas fixos das saídas válidas gravadas lote a lote
+SCHEMA_CLIENTES_VALIDOS = pa.schema([
+    ('id_cliente', pa.int64()),
+    ('nome', pa.string()),
+    ('email', pa.string()),
+    ('cidade', pa.string()),
+    ('estado', pa.string()),
+])
+SCHEMA_VENDAS_VALIDAS = pa.schema([
+    ('id_venda_raw', pa.int64()),
+    ('id_cliente', pa.int64()),
+    ('email', pa.string()),
+    ('data_venda', pa.timestamp('us')),
+    ('valor_venda', pa.float64()),
+    ('status_pedido', pa.string()),
+])
+
+#Mapeamento de status, comparado sem acentos ("concluido" e "concluído" caem na mesma chave)
+STATUS_MAP = {
+    "concluído": "entregue",
+    "finalizado": "entregue",
+    "pendente": "em transporte",
+    "em trânsito": "em transporte",
+    "encaminhado": "em transporte",
+    "atrasado": "atrasado"
+}
+_STATUS_MAP_SEM_ACENTOS = {normalizacao.sem_acentos(chave): valor for chave, valor in STATUS_MAP.items()}
+
+
+def _status(texto: str):
+    return _STATUS_MAP_SEM_ACENTOS.get(normalizacao.sem_acentos(texto.strip().lower()))
+
+
+def novo_indice_clientes() -> dict:
+    """Índice incremental dos clientes entre lotes: ids já vistos e ids válidos, como arrays int64 ordenados."""
+    return {
+        'vistos': np.empty(0, dtype='int64'),
+        'validos': np.empty(0, dtype='int64'),
+        'nulo_visto': False,
+    }
+
+
+def _ids(serie: pd.Series) -> np.ndarray:
+    return serie.dropna().to_numpy(dtype='int64')
+
+
+def clean_and_validate(df: pd.DataFrame, indice: dict = None) -> dict:
+    """Limpa, normaliza e valida clientes e vendas numa única passada sobre o extraído.
+
+    Com `indice` (ver novo_indice_clientes), `df` é um lote de uma entrada maior: clientes já vistos
+    em lotes anteriores não são revalidados e a checagem de cliente das vendas usa todos os válidos
+    até aqui. Como cada linha traz o cliente da própria venda, o resultado é o mesmo da validação
+    do extraído inteiro.
+
+    Retorna as partições 'clientes_validos', 'clientes_invalidos', 'vendas_validas' e 'vendas_invalidas'.
+    """
+    if indice is None:
+        logger.info("Iniciando limpeza e validação dos dados...")
 
     if df.empty:
         logger.error("DataFrame de entrada está vazio!")
         raise ValueError("DataFrame de entrada vazio")
 
     # CLIENTES
-    clientes = df[['id_cliente_raw', 'nome', 'email', 'cidade', 'estado']].drop_duplicates(subset=['id_cliente_raw']).copy()
+    clientes = df[['id_cliente_raw', 'nome', 'email', 'cidade', 'estado']].drop_duplicates(subset=['id_cliente_raw'])
+    if indice is not None:
+        # Mantém só a primeira ocorrência de cada cliente na entrada toda, como o drop_duplicates do modo em memória
+        ja_vistos = clientes['id_cliente_raw'].isin(indice['vistos'])
+        if indice['nulo_visto']:
+            ja_vistos |= clientes['id_cliente_raw'].isna()
+        clientes = clientes[~ja_vistos]
+    clientes = clientes.copy()
 
     # Limpeza básica
-    clientes['email'] = clientes['email'].astype(str).str.strip().str.lower()
-    clientes['estado'] = clientes['estado'].astype(str).str.strip().str[:2]
-    clientes['nome'] = clientes['nome'].fillna('').astype(str).str.strip().str.title()
-    clientes['cidade'] = clientes['cidade'].fillna('Desconhecido').astype(str).str.strip()
+    # Cada função roda uma vez por valor distinto (ver normalizacao.py), não uma vez por linha
+    clientes['email'] = normalizacao.normaliza(clientes['email'], 'email', lambda v: v.strip().lower())
+    clientes['estado'] = normalizacao.normaliza(clientes['estado'], 'estado', lambda v: v.strip()[:2])
+    clientes['nome'] = normalizacao.normaliza(clientes['nome'], 'nome', lambda v: v.strip().title(), preenche='')
+    clientes['cidade'] = normalizacao.normaliza(clientes['cidade'], 'cidade', str.strip, preenche='Desconhecido')
 
     #Validação
-    clientes['email_valido'] = clientes['email'].apply(lambda x: isinstance(x, str) and '@' in x and x not in ['', 'nan'])
-    clientes['nome_valido'] = clientes['nome'].apply(lambda x: isinstance(x, str) and len(x.strip()) > 0)
+    resultado_clientes = regras.avalia(clientes, REGRAS_CLIENTES)
+    for id_regra, mascara in resultado_clientes['mascaras'].items():
+        clientes[id_regra] = mascara
 
-    clientes_validos = clientes[clientes['email_valido'] & clientes['nome_valido']].copy()
-    clientes_invalidos = clientes[~(clientes['email_valido'] & clientes['nome_valido'])]
+    clientes_validos = clientes[resultado_clientes['valido']].copy()
+    clientes_invalidos = clientes[~resultado_clientes['valido']]
 
-    if not clientes_invalidos.empty:
-        logger.warning(f"{len(clientes_invalidos)} clientes inválidos serão descartados:")
-        for idx, row in clientes_invalidos.iterrows():
-            logger.warning(f"id_cliente_raw={row['id_cliente_raw']}, nome='{row['nome']}', email='{row['email']}'")
+    if indice is None and not clientes_invalidos.empty:
+        logger.warning(f"{len(clientes_invalidos)} clientes inválidos serão descartados (detalhes na quarentena).")
 
     clientes_validos.rename(columns={'id_cliente_raw': 'id_cliente'}, inplace=True)
     clientes_validos = clientes_validos[['id_cliente', 'nome', 'email', 'cidade', 'estado']]
@@ -42,53 +139,142 @@ def validate_data(df: pd.DataFrame) -> (pd.DataFrame, pd.DataFrame):
     # VENDAS
     vendas = df[['id_venda_raw', 'id_cliente_raw', 'email', 'data_venda', 'valor_venda', 'status_pedido']].copy()
 
-    #Mapeamento de status
-    status_map = {
-        "concluído": "entregue",
-        "finalizado": "entregue",
-        "pendente": "em transporte",
-        "em trânsito": "em transporte",
-        "encaminhado": "em transporte",
-        "atrasado": "atrasado"
+    vendas['status_pedido'] = normalizacao.normaliza(vendas['status_pedido'], 'status_pedido', _status)
+    vendas['data_venda'] = pd.to_datetime(vendas['data_venda'], errors='coerce')
+
+    #Status desconhecido (nulo após o mapeamento), data ou valor inválidos e cliente descartado reprovam a venda
+    if indice is None:
+        contexto = {'clientes_validos_ids': set(clientes_validos['id_cliente'])}
+    else:
+        indice['vistos'] = np.union1d(indice['vistos'], _ids(clientes['id_cliente_raw']))
+        indice['validos'] = np.union1d(indice['validos'], _ids(clientes_validos['id_cliente']))
+        indice['nulo_visto'] = indice['nulo_visto'] or bool(clientes['id_cliente_raw'].isna().any())
+        contexto = {'clientes_validos_ids': indice['validos']}
+    resultado_vendas = regras.avalia(vendas, REGRAS_VENDAS, contexto)
+    for id_regra, mascara in resultado_vendas['mascaras'].items():
+        vendas[id_regra] = mascara
+
+    vendas_validas = vendas[resultado_vendas['valido']].copy()
+    vendas_invalidas = vendas[~resultado_vendas['valido']]
+
+    if indice is None and not vendas_invalidas.empty:
+        logger.warning(f"{len(vendas_invalidas)} vendas inválidas foram descartadas (detalhes na quarentena).")
+
+    vendas_validas.rename(columns={'id_cliente_raw': 'id_cliente'}, inplace=True)
+    vendas_validas = vendas_validas[['id_venda_raw', 'id_cliente', 'email', 'data_venda', 'valor_venda', 'status_pedido']]
+
+    return {
+        'clientes_validos': artefatos.compacta(clientes_validos),
+        'clientes_invalidos': artefatos.compacta(clientes_invalidos, strings_arrow=False),
+        'vendas_validas': artefatos.compacta(vendas_validas),
+        'vendas_invalidas': artefatos.compacta(vendas_invalidas, strings_arrow=False),
     }
-    vendas['status_pedido'] = (
-        vendas['status_pedido']
-        .astype(str)
-        .str.strip()
-        .str.lower()
-        .map(status_map)
-    )
 
-    #Filtrar apenas status válidos (não nulos após o mapeamento)
-    vendas = vendas[vendas['status_pedido'].notna()]
 
-    vendas['data_venda'] = pd.to_datetime(vendas['data_venda'], errors='coerce')
-    vendas['valor_venda_valido'] = vendas['valor_venda'].apply(lambda x: pd.notna(x) and x >= 0)
+def validate_data(df: pd.DataFrame) -> (pd.DataFrame, pd.DataFrame):
+    particoes = clean_and_validate(df)
+    return particoes['clientes_validos'], particoes['vendas_validas']
 
-    clientes_validos_ids = set(clientes_validos['id_cliente'])
-    vendas['cliente_valido'] = vendas['id_cliente_raw'].apply(lambda x: x in clientes_validos_ids)
 
-    vendas_validas = vendas[
-        vendas['data_venda'].notna() &
-        vendas['valor_venda_valido'] &
-        vendas['cliente_valido']
-    ].copy()
+def _valida_particao(args):
+    """Valida as linhas cuja partição (id_cliente_raw % total) é `parte`, lendo o IPC compartilhado."""
+    origem_ipc, parte, total = args
+    tabela = artefatos.ler_ipc(origem_ipc)
+    ids = tabela.column('id_cliente_raw').fill_null(0).to_numpy()
+    tabela = tabela.filter(pa.array(ids % total == parte))
+    if tabela.num_rows == 0:
+        return None
 
-    vendas_invalidas = vendas[~(
-        vendas['data_venda'].notna() &
-        vendas['valor_venda_valido'] &
-        vendas['cliente_valido']
-    )]
+    df = tabela.to_pandas()
+    df = df.set_index('_linha')
+    df.index.name = None
+    return clean_and_validate(artefatos.compacta(df, strings_arrow=False))
 
-    if not vendas_invalidas.empty:
-        logger.warning(f"{len(vendas_invalidas)} vendas inválidas foram descartadas:")
-        cols_log = [col for col in ['id_venda_raw', 'id_cliente_raw', 'valor_venda', 'data_venda'] if col in vendas_invalidas.columns]
-        logger.warning(f"\n{vendas_invalidas[cols_log]}")
 
-    vendas_validas.rename(columns={'id_cliente_raw': 'id_cliente'}, inplace=True)
-    vendas_validas = vendas_validas[['id_venda_raw', 'id_cliente', 'email', 'data_venda', 'valor_venda', 'status_pedido']]
+def clean_and_validate_paralelo(origem: str, processos: int = max_workers, temp_dir: str = artefatos.TEMP_DIR) -> dict:
+    """Valida o extraído em `processos` partições por hash de id_cliente_raw e junta o resultado.
+
+    Todas as linhas de um cliente caem na mesma partição, então a deduplicação de clientes e a
+    checagem de cliente das vendas continuam corretas sem troca de dados entre processos. O
+    DataFrame não é enviado aos workers: cada um mapeia o mesmo arquivo Arrow IPC. A junção
+    reordena pela posição original da linha, reproduzindo a saída da validação sequencial.
+    O arquivo IPC é criado em `temp_dir` e apagado no fim.
+    """
+    origem_ipc = artefatos.exportar_ipc(origem, colunas=COLUNAS_ENTRADA, compactar=True, temp_dir=temp_dir)
+    tarefas = [(origem_ipc, parte, processos) for parte in range(processos)]
+    try:
+        try:
+            with ProcessPoolExecutor(max_workers=processos) as pool:
+                resultados = list(pool.map(_valida_particao, tarefas))
+        except AssertionError as e:
+            # Processos daemônicos (ex.: worker Celery) não podem criar filhos
+            logger.warning(f"Pool de processos indisponível ({e}). Validando partições sequencialmente.")
+            resultados = [_valida_particao(tarefa) for tarefa in tarefas]
+    finally:
+        os.remove(origem_ipc)
+
+    resultados = [r for r in resultados if r is not None]
+    if not resultados:
+        logger.error("DataFrame de entrada está vazio!")
+        raise ValueError("DataFrame de entrada vazio")
+
+    particoes = {}
+    for nome in resultados[0]:
+        juntas = pd.concat([r[nome] for r in resultados]).sort_index(kind='stable')
+        particoes[nome] = artefatos.compacta(juntas, strings_arrow=nome in ('clientes_validos', 'vendas_validas'))
+    logger.info(f"Validação paralela em {processos} partições concluída: "
+                f"{ {nome: len(p) for nome, p in particoes.items()} }")
+    return particoes
+
+
+def validate_em_lotes(origem: str, run_id: str = None, tamanho: int = tamanho_lote,
+                      temp_dir: str = artefatos.TEMP_DIR) -> dict:
+    """Valida o extraído lote a lote, sem carregá-lo inteiro na memória.
+
+    As saídas válidas são gravadas incrementalmente em Parquet em `temp_dir` e os rejeitados vão
+    para a quarentena a cada lote. Retorna os caminhos no mesmo formato de main().
+    """
+    logger.info(f"Iniciando validação em lotes de {tamanho} linhas...")
+    run_id = run_id or quarentena.run_id_padrao()
+    indice = novo_indice_clientes()
+    totais = {'clientes_validos': 0, 'clientes_invalidos': 0, 'vendas_validas': 0, 'vendas_invalidas': 0}
+    quarentenas = {'clientes_invalidos': [], 'vendas_invalidas': []}
+
+    caminho_clientes, escritor_clientes = artefatos.abrir_escritor('clientes_validos', SCHEMA_CLIENTES_VALIDOS, temp_dir)
+    caminho_vendas, escritor_vendas = artefatos.abrir_escritor('vendas_validas', SCHEMA_VENDAS_VALIDAS, temp_dir)
+    try:
+        lotes = artefatos.iterar(origem, colunas=COLUNAS_ENTRADA, tamanho_lote=tamanho, compactar=True, strings_arrow=False)
+        for parte, lote in enumerate(lotes):
+            if lote.empty:
+                continue
+            particoes = clean_and_validate(lote, indice)
+            artefatos.escrever_lote(escritor_clientes, particoes['clientes_validos'])
+            artefatos.escrever_lote(escritor_vendas, particoes['vendas_validas'])
+
+            for nome, entidade, ids_regras in [('clientes_invalidos', 'clientes', IDS_REGRAS_CLIENTES),
+                                               ('vendas_invalidas', 'vendas', IDS_REGRAS_VENDAS)]:
+                local = quarentena.quarentena(particoes[nome], entidade, ids_regras, run_id, parte=parte)
+                if local:
+                    quarentenas[nome].append(local)
+
+            for nome in totais:
+                totais[nome] += len(particoes[nome])
+    finally:
+        escritor_clientes.close()
+        escritor_vendas.close()
+
+    if totais['clientes_validos'] + totais['clientes_invalidos'] == 0:
+        logger.error("Arquivo extraído está vazio!")
+        raise ValueError("DataFrame de entrada vazio")
+
+    logger.info(f"Validação em lotes concluída: {totais} (índice com {len(indice['validos'])} clientes válidos).")
+    return {
+        'clientes': caminho_clientes,
+        'vendas': caminho_vendas,
+        'clientes_invalidos': quarentenas['clientes_invalidos'],
+        'vendas_invalidas': quarentenas['vendas_invalidas'],
+    }
 
-    return clientes_validos, vendas_validas
 
 def main(ti):
     logger.info("Executando validação a partir de arquivo extraído...")
@@ -98,18 +284,34 @@ def main(ti):
         logger.error("Caminho do arquivo extraído inválido ou não informado via XCom")
         raise ValueError("Arquivo extraído inválido")
 
-    df = pd.read_pickle(input_path)
+    # Sem vendas novas desde a última carga (ex.: o mesmo arquivo já ingerido continua na pasta):
+    # validate e load não têm o que fazer, mas a análise e o relatório seguem com o que está no banco
+    linhas = pq.read_metadata(input_path).num_rows
+    if linhas == 0:
+        logger.info("Nenhuma venda nova no arquivo extraído; validação e carga serão puladas.")
+        return None
 
-    clientes_validados, vendas_validadas = validate_data(df)
+    if modo_validacao == 'lotes':
+        return validate_em_lotes(input_path, getattr(ti, 'run_id', None))
 
-    os.makedirs('/opt/airflow/temp', exist_ok=True)
-    clientes_path = '/opt/airflow/temp/clientes_validos.pkl'
-    vendas_path = '/opt/airflow/temp/vendas_validas.pkl'
+    if max_workers > 1 and linhas >= min_linhas_paralelo:
+        particoes = clean_and_validate_paralelo(input_path)
+    else:
+        df = artefatos.carregar(input_path, colunas=COLUNAS_ENTRADA, compactar=True, strings_arrow=False)
+        particoes = clean_and_validate(df)
+    caminhos = {nome: artefatos.salvar(particoes[nome], nome) for nome in ['clientes_validos', 'vendas_validas']}
 
-    clientes_validados.to_pickle(clientes_path)
-    vendas_validadas.to_pickle(vendas_path)
+    # Rejeitados vão em lote para a quarentena, com as regras violadas e o run_id da DAG
+    run_id = getattr(ti, 'run_id', None)
+    caminhos['clientes_invalidos'] = quarentena.quarentena(particoes['clientes_invalidos'], 'clientes', IDS_REGRAS_CLIENTES, run_id)
+    caminhos['vendas_invalidas'] = quarentena.quarentena(particoes['vendas_invalidas'], 'vendas', IDS_REGRAS_VENDAS, run_id)
 
-    logger.info(f"{len(clientes_validados)} clientes válidos salvos em {clientes_path}")
-    logger.info(f"{len(vendas_validadas)} vendas válidas salvas em {vendas_path}")
+    logger.info(f"{len(particoes['clientes_validos'])} clientes válidos salvos em {caminhos['clientes_validos']}")
+    logger.info(f"{len(particoes['vendas_validas'])} vendas válidas salvas em {caminhos['vendas_validas']}")
 
-    return {'clientes': clientes_path, 'vendas': vendas_path}
+    return {
+        'clientes': caminhos['clientes_validos'],
+        'vendas': caminhos['vendas_validas'],
+        'clientes_invalidos': caminhos['clientes_invalidos'],
+        'vendas_invalidas': caminhos['vendas_invalidas'],
+    }
@@ -0,0 +1,32 @@
+import logging
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Marca d'água da extração incremental: maior id_venda_raw já entregue com sucesso ao load.
+# Só é avançada depois que a carga termina, então uma falha no meio do caminho
+# faz a próxima execução reprocessar as mesmas linhas. A tabela etl_watermark vem da migração 5.
+PIPELINE = 'pipeline_ecommerce'
+
+
+def ler_watermark(conn, pipeline: str = PIPELINE):
+    """Retorna o último id_venda_raw processado, ou None se o pipeline nunca rodou."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT ultimo_id_venda_raw FROM etl_watermark WHERE pipeline = %s", (pipeline,))
+        res = cur.fetchone()
+    conn.commit()
+    return res[0] if res else None
+
+
+def salvar_watermark(conn, ultimo_id_venda_raw: int, pipeline: str = PIPELINE) -> None:
+    """Avança a marca d'água (nunca retrocede) e confirma a transação."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO etl_watermark (pipeline, ultimo_id_venda_raw, atualizado_em)
+            VALUES (%s, %s, NOW())
+            ON CONFLICT (pipeline) DO UPDATE SET
+                ultimo_id_venda_raw = GREATEST(etl_watermark.ultimo_id_venda_raw, EXCLUDED.ultimo_id_venda_raw),
+                atualizado_em = NOW()
+        """, (pipeline, int(ultimo_id_venda_raw)))
+    conn.commit()
+    logger.info(f"Marca d'água de {pipeline} avançada para id_venda_raw={ultimo_id_venda_raw}.")
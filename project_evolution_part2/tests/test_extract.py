@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+import extract
+import migracoes
+
+CSV = (
+    "nome,email,cidade,estado,id_cliente,data_venda,valor_venda,status_pedido\n"
+    "Ana,ana@x.com,,SP,1,2024-01-02,10.5,entregue\n"
+    "Bia,,Rio,,,,,\n"
+)
+
+
+def _hashes(caminho, motor, monkeypatch):
+    monkeypatch.setattr(extract, 'csv_engine', motor)
+    return extract._hash_linhas(next(extract._le_csv(caminho, 'utf-8'))).tolist()
+
+
+def test_hash_linha_igual_nos_dois_motores(tmp_path, monkeypatch):
+    caminho = tmp_path / 'vendas.csv'
+    caminho.write_text(CSV, encoding='utf-8')
+    assert _hashes(str(caminho), 'pandas', monkeypatch) == _hashes(str(caminho), 'pyarrow', monkeypatch)
+
+
+@pytest.mark.parametrize('nulo', [None, float('nan'), pd.NA])
+def test_hash_linha_nao_depende_do_tipo_do_nulo(nulo):
+    vazio = pd.DataFrame({'nome': ['Ana'], 'cidade': ['']})
+    com_nulo = pd.DataFrame({'nome': ['Ana'], 'cidade': pd.Series([nulo], dtype=object)})
+    assert extract._hash_linhas(com_nulo).tolist() == extract._hash_linhas(vazio).tolist()
+
+
+def test_importar_nao_cria_a_pasta_temporaria(tmp_path):
+    pasta = tmp_path / 'temp'
+    codigo = "import sys, artefatos; artefatos.TEMP_DIR = sys.argv[1]; import extract"
+    subprocess.run([sys.executable, '-c', codigo, str(pasta)], check=True, cwd=os.path.dirname(extract.__file__))
+    assert not pasta.exists()
+
+
+def test_extract_data_grava_em_temp_dir(banco, tmp_path, monkeypatch):
+    migracoes.aplicar()
+    (tmp_path / 'csv').mkdir()
+    monkeypatch.setattr(extract, 'csv_dir', str(tmp_path / 'csv'))
+    resultado = extract.extract_data(temp_dir=str(tmp_path / 'temp'))
+    assert resultado['caminho'] == str(tmp_path / 'temp' / 'df_extraido.parquet')
+    assert os.path.exists(resultado['caminho'])
+
+
+@pytest.mark.parametrize('valor, esperado', [
+    (True, True), ('true', True), ('True', True), ('1', True), (1, True), ('sim', True),
+    (False, False), ('false', False), ('0', False), (0, False), ('', False), (None, False),
+])
+def test_reprocessar_janela_do_conf(monkeypatch, valor, esperado):
+    chamadas = []
+    monkeypatch.setattr(extract, 'extract_data',
+                        lambda reprocessar_janela: chamadas.append(reprocessar_janela) or
+                        {'caminho': 'df_extraido.parquet', 'ultimo_id_venda_raw': None})
+    dag_run = type('DagRun', (), {'conf': {'reprocessar_janela': valor}})()
+    extract.main(dag_run=dag_run)
+    assert chamadas == [esperado]
@@ -0,0 +1,117 @@
+"""Teto de memória da ingestão em blocos: o pico de RSS não pode crescer com o tamanho do CSV.
+
+Cada medida roda num processo novo (o ru_maxrss é o pico do processo inteiro) sobre um CSV
+sintético 4x maior que o outro. Por padrão os arquivos têm algumas centenas de MB no total;
+TEST_MEMORIA_GB=2 repete as medidas com arquivos de 0,5 e 2 GB.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import db
+import extract
+import migracoes
+
+SCRIPTS = os.path.join(os.path.dirname(__file__), '..', 'dags', 'scripts')
+TAMANHO_GB = float(os.getenv('TEST_MEMORIA_GB', '0'))
+
+# Processo filho: lê (e, com banco, grava em staging) o CSV inteiro e imprime o pico de RSS em MB
+FILHO = """
+import json, resource, sys
+sys.path.insert(0, sys.argv[1])
+import db, extract
+caminho, params = sys.argv[2], json.loads(sys.argv[3])
+if params:
+    db.DB_CONFIG.update(params)
+    resultado = extract._ingere_arquivo(caminho)
+    assert resultado['status'] == 'ok', resultado
+else:
+    for bloco in extract._le_csv(caminho, 'utf-8'):
+        pass
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+"""
+
+
+def _gera_csv(caminho, megabytes: float) -> None:
+    """CSV no formato de novas_vendas.csv com `megabytes` MB, repetindo um bloco de 100 mil linhas."""
+    rng = np.random.default_rng(0)
+    n = 100000
+    ids = np.arange(n)
+    bloco = pd.DataFrame({
+        'nome': 'Cliente Exemplo',
+        'email': [f'cliente{i % 50000}@exemplo.com' for i in ids],
+        'cidade': 'São Paulo',
+        'estado': 'SP',
+        'id_cliente': ids % 50000,
+        'data_venda': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, n), unit='D'),
+        'valor_venda': np.round(rng.uniform(1, 1000, n), 2),
+        'status_pedido': rng.choice(['concluído', 'pendente', 'atrasado'], n),
+    }).to_csv(header=False, index=False, date_format='%Y-%m-%d')
+    with open(caminho, 'w', encoding='utf-8') as f:
+        f.write(','.join(extract.colunas_csv) + '\n')
+        while f.tell() < megabytes * 1024 ** 2:
+            f.write(bloco)
+
+
+def _pico_mb(caminho, motor: str, params=None) -> float:
+    # Blocos pequenos para que os dois arquivos passem bem da janela de leitura antecipada do Arrow
+    env = dict(os.environ, EXTRACT_CSV_ENGINE=motor, EXTRACT_CHUNK_SIZE='20000', EXTRACT_PYARROW_BLOCK_MB='1')
+    saida = subprocess.run([sys.executable, '-c', FILHO, SCRIPTS, str(caminho), json.dumps(params or {})],
+                           env=env, capture_output=True, text=True, check=True)
+    return float(saida.stdout.strip().splitlines()[-1])
+
+
+def _tamanhos(padrao: tuple) -> tuple:
+    return (TAMANHO_GB * 1024 / 4, TAMANHO_GB * 1024) if TAMANHO_GB else padrao
+
+
+def _confere_teto(pequeno, grande, medir):
+    pico_pequeno, pico_grande = medir(pequeno), medir(grande)
+    mb_pequeno, mb_grande = (os.path.getsize(c) / 1024 ** 2 for c in (pequeno, grande))
+    # Arquivo 4x maior, pico praticamente igual: a folga cobre ruído do alocador, não o arquivo
+    assert pico_grande <= pico_pequeno * 1.15, (
+        f"pico {pico_pequeno:.0f} MB com {mb_pequeno:.0f} MB de CSV e {pico_grande:.0f} MB com {mb_grande:.0f} MB"
+    )
+
+
+def _arquivos(pasta, padrao: tuple) -> tuple:
+    pequeno, grande = pasta / 'pequeno.csv', pasta / 'grande.csv'
+    mb_pequeno, mb_grande = _tamanhos(padrao)
+    _gera_csv(pequeno, mb_pequeno)
+    _gera_csv(grande, mb_grande)
+    return pequeno, grande
+
+
+@pytest.fixture(scope='module')
+def arquivos_leitura(tmp_path_factory):
+    return _arquivos(tmp_path_factory.mktemp('leitura'), (64, 256))
+
+
+@pytest.fixture(scope='module')
+def arquivos_staging(tmp_path_factory):
+    # A gravação calcula o hash de cada linha: arquivos menores para o teste não levar minutos
+    return _arquivos(tmp_path_factory.mktemp('staging'), (16, 64))
+
+
+@pytest.mark.parametrize('motor', ['pandas', 'pyarrow'])
+def test_leitura_em_blocos_com_memoria_constante(arquivos_leitura, motor):
+    _confere_teto(*arquivos_leitura, lambda caminho: _pico_mb(caminho, motor))
+
+
+def test_staging_em_blocos_com_memoria_constante(arquivos_staging, banco):
+    migracoes.aplicar()
+
+    def medir(caminho):
+        pico = _pico_mb(caminho, 'pandas', banco)
+        with db.conexao() as conn, conn.cursor() as cur:
+            # Mesmo ponto de partida para as duas medidas
+            cur.execute("TRUNCATE vendas_raw, arquivos_ingeridos")
+            conn.commit()
+        return pico
+
+    _confere_teto(*arquivos_staging, medir)
@@ -0,0 +1,27 @@
+import pandas as pd
+
+import db
+import load
+import migracoes
+import validate
+
+
+def test_cliente_sem_estado_gravado_como_nulo(banco):
+    migracoes.aplicar()
+    extraido = pd.DataFrame({
+        'id_cliente_raw': [1, 2],
+        'nome': ['Lucia Alves', 'Ana'],
+        'email': ['lucia@exemplo.com', 'ana@exemplo.com'],
+        'cidade': ['Recife', None],
+        'estado': [None, 'PE'],
+        'id_venda_raw': [1, 2],
+        'data_venda': ['2024-01-05', '2024-01-06'],
+        'valor_venda': [10.0, 20.0],
+        'status_pedido': ['concluído', 'pendente'],
+    })
+    particoes = validate.clean_and_validate(extraido)
+    load.load_banco(particoes['clientes_validos'][load.COLUNAS_CLIENTES], particoes['vendas_validas'][load.COLUNAS_VENDAS])
+
+    with db.conexao() as conn, conn.cursor() as cur:
+        cur.execute("SELECT nome, cidade, estado FROM clientes ORDER BY email")
+        assert cur.fetchall() == [('Ana', 'Desconhecido', 'PE'), ('Lucia Alves', 'Recife', None)]
@@ -0,0 +1,103 @@
+import pandas as pd
+import pytest
+
+import db
+import load
+import migracoes
+
+CLIENTES = pd.DataFrame({'nome': ['Ana'], 'email': ['ana@exemplo.com'], 'cidade': ['Recife'], 'estado': ['PE']})
+
+
+def _vendas(ids, status='entregue'):
+    return pd.DataFrame({
+        'id_venda_raw': ids,
+        'email': 'ana@exemplo.com',
+        'data_venda': pd.Timestamp('2024-01-05'),
+        'valor_venda': 10.0,
+        'status_pedido': status,
+    })
+
+
+def _falha_no_lote(monkeypatch, numero):
+    """Faz a carga do lote `numero` (contando desde o início da chamada) falhar, como uma task interrompida."""
+    original = load._carrega_lote_vendas
+    chamadas = []
+
+    def carrega(cur, lote):
+        chamadas.append(lote)
+        if len(chamadas) == numero + 1:
+            raise RuntimeError("falha simulada")
+        original(cur, lote)
+    monkeypatch.setattr(load, '_carrega_lote_vendas', carrega)
+
+
+def _estado(cur):
+    cur.execute("SELECT id_venda_raw, status_pedido FROM vendas WHERE is_current ORDER BY id_venda_raw::INT")
+    vendas = cur.fetchall()
+    cur.execute("SELECT run_id, lote FROM carga_checkpoint ORDER BY run_id, lote")
+    return vendas, cur.fetchall()
+
+
+@pytest.fixture
+def carga(banco, monkeypatch):
+    migracoes.aplicar()
+    monkeypatch.setattr(load, 'tamanho_lote', 2)
+    return monkeypatch
+
+
+def test_retomada_pula_so_lotes_com_a_mesma_identidade(carga):
+    with carga.context() as m:
+        _falha_no_lote(m, 1)
+        with pytest.raises(RuntimeError):
+            load.load_banco(CLIENTES, _vendas([1, 2, 3, 4]), run_id='r1', artefato='vendas.parquet')
+    with db.conexao() as conn, conn.cursor() as cur:
+        assert _estado(cur) == ([('1', 'entregue'), ('2', 'entregue')], [('r1', 0)])
+
+    # O validate foi refeito entre as tentativas: mesmo artefato e total, outras vendas no lote 0
+    carregados = []
+    original = load._carrega_lote_vendas
+    carga.setattr(load, '_carrega_lote_vendas', lambda cur, lote: (carregados.append(list(lote['id_venda_raw'])),
+                                                                     original(cur, lote)))
+    load.load_banco(CLIENTES, _vendas([5, 6, 3, 4]), run_id='r1', artefato='vendas.parquet')
+    assert carregados == [[5, 6], [3, 4]]
+
+    carregados.clear()
+    with carga.context() as m:
+        _falha_no_lote(m, 1)
+        with pytest.raises(RuntimeError):
+            load.load_banco(CLIENTES, _vendas([7, 8, 9, 10]), run_id='r2', artefato='vendas.parquet')
+    # Mesmas vendas na nova tentativa: o lote 0 é pulado (o lote 1 da tentativa que falhou não chegou a carregar)
+    load.load_banco(CLIENTES, _vendas([7, 8, 9, 10]), run_id='r2', artefato='vendas.parquet')
+    assert carregados == [[7, 8], [9, 10]]
+    with db.conexao() as conn, conn.cursor() as cur:
+        vendas, checkpoints = _estado(cur)
+    assert [venda for venda, _ in vendas] == [str(i) for i in range(1, 11)]
+    assert checkpoints == []
+
+
+def test_mudanca_de_tamanho_do_lote_recomeca_a_carga(carga):
+    vendas = _vendas([1, 2, 3, 4, 5, 6])
+    with carga.context() as m:
+        _falha_no_lote(m, 2)
+        with pytest.raises(RuntimeError):
+            load.load_banco(CLIENTES, vendas, run_id='r1')
+
+    # Com lotes de 3, o "lote 1" antigo (vendas 3 e 4) não corresponde mais a nenhum lote novo
+    carga.setattr(load, 'tamanho_lote', 3)
+    load.load_banco(CLIENTES, vendas.assign(status_pedido='atrasado'), run_id='r1')
+    with db.conexao() as conn, conn.cursor() as cur:
+        atuais, checkpoints = _estado(cur)
+    assert atuais == [(str(i), 'atrasado') for i in range(1, 7)]
+    assert checkpoints == []
+
+
+def test_checkpoints_orfaos_sao_removidos(carga):
+    with db.conexao() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO carga_checkpoint (run_id, lote, linhas, confirmado_em) VALUES
+                ('abandonado', 0, 2, NOW() - INTERVAL '30 days'), ('recente', 0, 2, NOW())
+        """)
+        conn.commit()
+    load.load_banco(CLIENTES, _vendas([1]), run_id='r1')
+    with db.conexao() as conn, conn.cursor() as cur:
+        assert _estado(cur)[1] == [('recente', 0)]
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+import db
+import load
+import migracoes
+import particionamento
+
+# Lotes aplicados em sequência pelos dois caminhos do SCD2: (id_venda_raw, status, valor, data)
+LOTES = [
+    [
+        (1, 'entregue', 10.0, '2024-01-05'),
+        (2, 'em transporte', 20.0, '2024-01-06'),
+        (3, 'em transporte', 30.0, '2024-01-07'),
+    ],
+    [
+        (1, 'entregue', 10.0, '2024-01-05'),       # sem mudança
+        (2, 'entregue', 20.0, '2024-01-06'),       # status mudou
+        (3, 'em transporte', 30.0, '2024-01-07'),  # igual à atual e depois muda no mesmo lote
+        (3, 'em transporte', 35.5, '2024-01-07'),
+        (4, 'atrasado', 40.0, '2024-02-01'),       # nova
+        (5, 'em transporte', 50.0, '2024-02-02'),  # nova com várias versões no mesmo lote
+        (5, 'em transporte', 50.0, '2024-02-02'),
+        (5, 'atrasado', 50.0, '2024-02-02'),
+        (5, 'entregue', 50.0, '2024-02-03'),
+    ],
+    [
+        (2, 'entregue', 20.0, '2024-01-06'),       # sem mudança
+        (5, 'atrasado', 50.0, '2024-02-02'),       # volta a um estado anterior
+        (5, 'entregue', 50.0, '2024-02-03'),
+    ],
+]
+
+COLUNAS = "id_venda, id_venda_raw, id_cliente, data_venda, valor_venda, status_pedido, valid_from, valid_to, is_current, hash_versao"
+
+
+def _df(lote):
+    return pd.DataFrame({
+        'id_venda_raw': [venda for venda, _, _, _ in lote],
+        'id_cliente': 1,
+        'data_venda': pd.to_datetime([data for _, _, _, data in lote]),
+        'valor_venda': [valor for _, _, valor, _ in lote],
+        'status_pedido': [status for _, status, _, _ in lote],
+    })
+
+
+def _aplica(cur, conn, scd2):
+    cur.execute("TRUNCATE vendas RESTART IDENTITY")
+    conn.commit()
+    for lote in LOTES:
+        scd2(cur, _df(lote))
+        conn.commit()
+    cur.execute(f"SELECT {COLUNAS} FROM vendas ORDER BY id_venda")
+    return cur.fetchall()
+
+
+@pytest.mark.parametrize('particionada', [False, True])
+def test_scd2_em_conjunto_igual_ao_por_linha(banco, particionada):
+    migracoes.aplicar()
+    with db.conexao() as conn, conn.cursor() as cur:
+        cur.execute("INSERT INTO clientes (nome, email) VALUES ('Ana', 'ana@exemplo.com')")
+        conn.commit()
+    if particionada:
+        particionamento.migrar()
+
+    with db.conexao() as conn, conn.cursor() as cur:
+        por_linha = _aplica(cur, conn, load._scd2_por_linha)
+        em_conjunto = _aplica(cur, conn, load._scd2_em_conjunto)
+
+    assert em_conjunto == por_linha
+
+    atuais = {linha[1]: linha for linha in por_linha if linha[8]}
+    assert sorted(atuais) == ['1', '2', '3', '4', '5']
+    assert atuais['3'][4] == pytest.approx(35.5)
+    assert atuais['5'][5] == 'entregue'
+    # 5: três versões no lote 2 (a linha repetida não conta) e duas no lote 3
+    assert [linha[5] for linha in por_linha if linha[1] == '5'] == [
+        'em transporte', 'atrasado', 'entregue', 'atrasado', 'entregue']
+    assert sum(1 for linha in por_linha if linha[1] == '1') == 1
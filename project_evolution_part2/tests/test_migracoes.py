@@ -0,0 +1,39 @@
+import inspect
+
+import migracoes
+
+
+def test_aplicar_nao_recebe_o_contexto_da_task():
+    # O PythonOperator passa o contexto inteiro a callables com **kwargs; com parâmetros nomeados, só os de mesmo nome
+    parametros = inspect.signature(migracoes.aplicar).parameters.values()
+    assert all(p.kind is not inspect.Parameter.VAR_KEYWORD for p in parametros)
+    assert not {p.name for p in parametros} & {'ti', 'dag', 'ds', 'run_id', 'params', 'conf', 'task'}
+
+
+def test_aplicar_e_idempotente(banco):
+    versao = migracoes.aplicar()
+    assert versao == migracoes.MIGRACOES[-1][0]
+    assert migracoes.aplicar(database=banco['database']) == versao
+
+
+def test_backfill_do_hash_versao_igual_ao_da_carga(banco):
+    import db
+    import load
+
+    migracoes.aplicar()
+    with db.conexao() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO vendas (id_venda_raw, data_venda, valor_venda, status_pedido, is_current)
+            VALUES ('1', '2024-03-09', 10.5, 'entregue', TRUE), ('2', NULL, NULL, NULL, TRUE)
+        """)
+        # Reaplica a versão 8 (e as seguintes) como num banco que ainda não tinha a coluna preenchida
+        cur.execute("DELETE FROM schema_migracoes WHERE versao >= 8")
+        conn.commit()
+    migracoes.aplicar()
+
+    with db.conexao() as conn, conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT COUNT(*) FROM vendas
+            WHERE hash_versao = {load._expr_hash_versao('status_pedido', 'valor_venda', 'data_venda')}
+        """)
+        assert cur.fetchone()[0] == 2
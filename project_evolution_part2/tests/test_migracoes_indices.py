@@ -0,0 +1,93 @@
+"""Os índices da migração 3 (e o da 8) servem as consultas do pipeline: EXPLAIN num banco populado."""
+import json
+
+import pytest
+
+import analise_gera_csv
+import db
+import migracoes
+
+# Com poucos milhares de clientes o planner prefere (com razão) o Seq Scan: volume de produção
+CLIENTES = 200000
+VENDAS = 200000
+
+
+def _nos(plano: dict) -> list:
+    """(tipo do nó, índice) de todos os nós de um plano EXPLAIN (FORMAT JSON)."""
+    nos = [(plano['Node Type'], plano.get('Index Name'))]
+    for filho in plano.get('Plans', []):
+        nos.extend(_nos(filho))
+    return nos
+
+
+def _explain(cur, sql: str, params=None) -> list:
+    cur.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+    plano = cur.fetchone()[0]
+    plano = plano if isinstance(plano, list) else json.loads(plano)
+    return _nos(plano[0]['Plan'])
+
+
+@pytest.fixture
+def populado(banco):
+    migracoes.aplicar()
+    with db.conexao() as conn, conn.cursor() as cur:
+        cur.execute(f"""
+            INSERT INTO clientes_raw (nome, email, cidade, estado, flag_valid)
+            SELECT 'Cliente ' || i, 'cliente' || i || '@exemplo.com', 'São Paulo', 'SP', TRUE
+            FROM generate_series(1, {CLIENTES}) i
+        """)
+        cur.execute("INSERT INTO clientes (nome, email, cidade, estado) SELECT nome, email, cidade, estado FROM clientes_raw")
+        # Três anos de vendas: a janela de 30 dias do relatório e do extract pega uma fração pequena
+        cur.execute(f"""
+            INSERT INTO vendas_raw (id_cliente_raw, data_venda, valor_venda, status_pedido, flag_valid, hash_linha)
+            SELECT 1 + i % {CLIENTES}, CURRENT_DATE - (i % 1095), i % 1000, 'concluído', TRUE, md5(i::TEXT)
+            FROM generate_series(1, {VENDAS}) i
+        """)
+        cur.execute(f"""
+            INSERT INTO vendas (id_cliente, data_venda, valor_venda, status_pedido, id_venda_raw, is_current, hash_versao)
+            SELECT 1 + i % {CLIENTES}, CURRENT_DATE - (i % 1095), i % 1000,
+                   (ARRAY['entregue', 'entregue', 'entregue', 'em transporte', 'atrasado'])[1 + i % 5],
+                   i::TEXT, TRUE, md5(i::TEXT)
+            FROM generate_series(1, {VENDAS}) i
+        """)
+        conn.commit()
+        # VACUUM atualiza o mapa de visibilidade, condição para o Index Only Scan
+        conn.autocommit = True
+        cur.execute("VACUUM ANALYZE")
+        conn.autocommit = False
+    with db.conexao() as conn, conn.cursor() as cur:
+        yield cur
+
+
+def _emails(n: int = 200) -> list:
+    return [f'cliente{i}@exemplo.com' for i in range(1, CLIENTES, CLIENTES // n)]
+
+
+def test_extract_resolve_emails_so_pelo_indice(populado):
+    # Mesma consulta de extract._stage_chunk
+    nos = _explain(populado, "SELECT email, id_cliente_raw FROM clientes_raw WHERE email = ANY(%s)", (_emails(),))
+    assert ('Index Only Scan', 'idx_clientes_raw_email_id') in nos
+
+
+def test_load_resolve_emails_so_pelo_indice(populado):
+    # Mesma consulta de load._carrega_lote_vendas
+    nos = _explain(populado, "SELECT email, id_cliente FROM clientes WHERE email = ANY(%s)", (_emails(),))
+    assert ('Index Only Scan', 'idx_clientes_email_id') in nos
+
+
+def test_extract_janela_de_30_dias_usa_indice_de_data(populado):
+    nos = _explain(populado, "SELECT * FROM vendas_raw v WHERE v.data_venda >= NOW() - INTERVAL '30 days'")
+    assert any(indice == 'idx_vendas_raw_data_venda' for _, indice in nos)
+
+
+def test_scd2_por_linha_compara_hash_so_pelo_indice(populado):
+    nos = _explain(populado, "SELECT hash_versao FROM vendas WHERE id_venda_raw = %s AND is_current = TRUE", ('123',))
+    assert any(tipo in ('Index Only Scan', 'Index Scan') and indice in ('idx_vendas_raw_current_hash', 'idx_venda_raw_current')
+               for tipo, indice in nos)
+
+
+def test_relatorio_usa_os_indices_parciais(populado):
+    top = _explain(populado, analise_gera_csv.sql_top_10_clientes())
+    atraso = _explain(populado, analise_gera_csv.sql_atraso_clientes())
+    assert any(indice == 'idx_vendas_entregue_data' for _, indice in top)
+    assert any(indice == 'idx_vendas_atrasado_data' for _, indice in atraso)
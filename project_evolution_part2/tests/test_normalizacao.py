@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import normalizacao
+import validate
+
+
+@pytest.fixture(autouse=True)
+def _sem_cache():
+    normalizacao.limpa_caches()
+    yield
+    normalizacao.limpa_caches()
+
+
+@pytest.mark.parametrize('dtype', [object, 'str', 'category'])
+def test_normaliza_igual_ao_str_linha_a_linha(dtype):
+    serie = pd.Series([' SP', 'SP ', 'rj', None, 'SP'], dtype=dtype)
+    resultado = normalizacao.normaliza(serie, 'estado', lambda v: v.strip()[:2].upper())
+    assert resultado.astype(object).where(resultado.notna(), None).tolist() == ['SP', 'SP', 'RJ', None, 'SP']
+    if dtype == 'category':
+        assert list(resultado.cat.categories) == ['RJ', 'SP']
+
+
+def test_normaliza_preenche_nulos():
+    serie = pd.Series(['  ana ', np.nan], dtype=object)
+    assert normalizacao.normaliza(serie, 'nome', lambda v: v.strip().title(), preenche='').tolist() == ['Ana', '']
+
+
+def test_status_sem_acentos_com_cache_entre_lotes():
+    primeiro = pd.Series(['concluído', 'Concluido ', 'cancelado'], dtype=object)
+    segundo = pd.Series(['concluido', 'EM TRANSITO'], dtype='category')
+    assert normalizacao.normaliza(primeiro, 'status_pedido', validate._status).tolist()[:2] == ['entregue', 'entregue']
+    assert normalizacao.normaliza(segundo, 'status_pedido', validate._status).tolist() == ['entregue', 'em transporte']
+
+
+def test_mais_distintos_que_o_cache(monkeypatch):
+    monkeypatch.setattr(normalizacao, 'cache_max', 2)
+    serie = pd.Series(['a ', 'b ', 'c ', 'a '], dtype=object)
+    assert normalizacao.normaliza(serie, 'nome', str.strip).tolist() == ['a', 'b', 'c', 'a']
+    assert 'nome' not in normalizacao._caches
@@ -0,0 +1,110 @@
+from datetime import date, timedelta
+
+import pytest
+
+import db
+import migracoes
+import particionamento
+
+
+def _indices(cur, tabela):
+    cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", (tabela,))
+    return {nome for (nome,) in cur.fetchall()}
+
+
+@pytest.fixture
+def particionado(banco):
+    migracoes.aplicar()
+    with db.conexao() as conn, conn.cursor() as cur:
+        # Índice criado fora das migrações: também precisa sobreviver à conversão
+        cur.execute("CREATE INDEX idx_vendas_raw_status ON vendas_raw (status_pedido) WHERE flag_valid")
+        conn.commit()
+        antes = {tabela: _indices(cur, tabela) for tabela in particionamento.TABELAS}
+    particionamento.migrar(meses=0)
+    return antes
+
+
+def test_migracao_recria_todos_os_indices(particionado):
+    with db.conexao() as conn, conn.cursor() as cur:
+        for tabela, antes in particionado.items():
+            depois = _indices(cur, tabela)
+            # A chave primária vira idx_<tabela>_pk; todos os outros mantêm o nome
+            assert antes - {f'{tabela}_pkey'} <= depois
+            assert f'idx_{tabela}_pk' in depois
+        cur.execute("SELECT indexdef FROM pg_indexes WHERE indexname = 'idx_venda_raw_current'")
+        assert '(id_venda_raw, data_venda) WHERE (is_current = true)' in cur.fetchone()[0]
+
+
+@pytest.mark.parametrize('modo', ['executemany', 'copy'])
+def test_linhas_sem_data_continuam_deduplicadas(particionado, modo):
+    # Mesmo INSERT ... ON CONFLICT DO NOTHING (sem alvo) de extract._stage_chunk
+    sql = """
+        INSERT INTO vendas_raw (id_cliente_raw, data_venda, valor_venda, status_pedido, flag_valid, hash_linha)
+        VALUES (1, %s, 10, 'entregue', TRUE, %s)
+        ON CONFLICT DO NOTHING
+    """
+    linhas = [(None, 'sem-data'), (None, 'sem-data'), ('2024-01-05', 'com-data'), ('2024-01-05', 'com-data')]
+    with db.conexao() as conn, conn.cursor() as cur:
+        if modo == 'executemany':
+            cur.executemany(sql, linhas)
+        else:
+            for linha in linhas:
+                cur.execute(sql, linha)
+        conn.commit()
+        cur.execute("SELECT hash_linha, COUNT(*) FROM vendas_raw GROUP BY hash_linha ORDER BY hash_linha")
+        assert cur.fetchall() == [('com-data', 1), ('sem-data', 1)]
+
+
+def test_particao_nova_recebe_as_linhas_da_default(particionado):
+    depois = particionamento._mes(date.today(), 5)
+    with db.conexao() as conn, conn.cursor() as cur:
+        # Venda além dos meses preparados (meses=0): cai na default
+        cur.execute("""
+            INSERT INTO vendas_raw (id_cliente_raw, data_venda, valor_venda, status_pedido, flag_valid, hash_linha)
+            VALUES (1, %s, 10, 'entregue', TRUE, 'futura'), (1, NULL, 10, 'entregue', TRUE, 'sem-data')
+        """, (depois,))
+        conn.commit()
+
+        particionamento.cria_particoes_futuras(cur, meses=6)
+        conn.commit()
+
+        cur.execute("SELECT tableoid::regclass::TEXT, hash_linha FROM vendas_raw ORDER BY hash_linha")
+        assert cur.fetchall() == [(f'vendas_raw_p{depois:%Y_%m}', 'futura'), ('vendas_raw_default', 'sem-data')]
+        cur.execute("""
+            SELECT pg_get_expr(c.relpartbound, c.oid) FROM pg_class c WHERE c.relname = 'vendas_raw_default'
+        """)
+        assert cur.fetchone()[0] == 'DEFAULT'
+
+
+def test_relatorio_le_so_as_particoes_recentes(banco):
+    migracoes.aplicar()
+    hoje = date.today()
+    with db.conexao() as conn, conn.cursor() as cur:
+        cur.execute("INSERT INTO clientes (nome, email) VALUES ('Ana', 'ana@exemplo.com')")
+        # Uma venda entregue e uma atrasada por semana, ao longo de um ano
+        cur.execute("""
+            INSERT INTO vendas (id_cliente, data_venda, valor_venda, status_pedido, id_venda_raw, is_current)
+            SELECT 1, CURRENT_DATE - 7 * (i / 2), 10, CASE WHEN i % 2 = 0 THEN 'entregue' ELSE 'atrasado' END, i::TEXT, TRUE
+            FROM generate_series(0, 105) i
+        """)
+        conn.commit()
+    particionamento.migrar(meses=2)
+
+    lidas = particionamento.verificar()
+
+    with db.conexao() as conn, conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM pg_inherits WHERE inhparent = 'vendas'::regclass")
+        assert cur.fetchone()[0] >= 14  # 12 meses de histórico, os futuros e a default
+
+    # A janela mais longa do relatório é de 30 dias: no máximo o mês anterior, o atual, os futuros e a default
+    recentes = {f'vendas_p{particionamento._mes(hoje, d):%Y_%m}' for d in range(-1, 3)} | {'vendas_default'}
+    for consulta, particoes in lidas.items():
+        assert set(particoes) <= recentes, consulta
+    assert f'vendas_p{hoje:%Y_%m}' in lidas['top_10_clientes']
+    assert f'vendas_p{hoje - timedelta(days=30):%Y_%m}' in lidas['atraso_clientes']
+
+def test_verificar_falha_sem_poda(banco):
+    migracoes.aplicar()
+    # vendas ainda não particionada: nenhuma partição para podar
+    with pytest.raises(RuntimeError, match='sem poda'):
+        particionamento.verificar()
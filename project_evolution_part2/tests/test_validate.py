@@ -0,0 +1,166 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import artefatos
+import normalizacao
+import quarentena
+import regras
+import validate
+
+# Regras como eram antes da vetorização (.apply linha a linha), usadas como referência
+LAMBDAS_ANTIGAS = {
+    'email_valido': lambda x: isinstance(x, str) and '@' in x and x not in ['', 'nan'],
+    'nome_valido': lambda x: isinstance(x, str) and len(x.strip()) > 0,
+    'valor_venda_valido': lambda x: pd.notna(x) and x >= 0,
+}
+
+EMAILS = ['ana@x.com', ' ANA@X.COM ', '', '   ', None, np.nan, 'nan', 'NaN', 'sem-arroba', '@', 'a@b',
+          ' a@b ', 'nan@x.com']
+NOMES = ['ana', ' bia souza ', '', '   ', None, np.nan, 'nan', '\t', ' ', 'x', 'joão']
+VALORES = [-1.0, -0.0, 0.0, 0.01, 10.5, np.nan, None, np.inf, -np.inf, 1e12]
+
+
+def _mascara(df, id_regra, contexto=None):
+    regras_do_id = [r for r in validate.REGRAS_CLIENTES + validate.REGRAS_VENDAS if r[0] == id_regra]
+    return regras.avalia(df, regras_do_id, contexto)['mascaras'][id_regra].tolist()
+
+
+@pytest.fixture(autouse=True)
+def _sem_cache():
+    normalizacao.limpa_caches()
+    yield
+    normalizacao.limpa_caches()
+
+
+def test_email_valido_igual_a_lambda():
+    bruto = pd.Series(EMAILS, dtype=object)
+    antigo = bruto.astype(str).str.strip().str.lower().apply(LAMBDAS_ANTIGAS['email_valido'])
+    novo = pd.DataFrame({'email': normalizacao.normaliza(bruto, 'email', lambda v: v.strip().lower())})
+    assert _mascara(novo, 'email_valido') == antigo.tolist()
+
+
+def test_nome_valido_igual_a_lambda():
+    bruto = pd.Series(NOMES, dtype=object)
+    antigo = bruto.fillna('').astype(str).str.strip().str.title().apply(LAMBDAS_ANTIGAS['nome_valido'])
+    novo = pd.DataFrame({'nome': normalizacao.normaliza(bruto, 'nome', lambda v: v.strip().title(), preenche='')})
+    assert _mascara(novo, 'nome_valido') == antigo.tolist()
+
+
+def test_valor_venda_valido_igual_a_lambda():
+    serie = pd.Series(VALORES, dtype='float64')
+    antigo = serie.apply(LAMBDAS_ANTIGAS['valor_venda_valido'])
+    assert _mascara(pd.DataFrame({'valor_venda': serie}), 'valor_venda_valido') == antigo.tolist()
+
+
+@pytest.mark.parametrize('dtype', ['float64', 'Int64'])
+@pytest.mark.parametrize('conjunto', [set, lambda ids: np.array(sorted(ids), dtype='int64')])
+def test_cliente_valido_igual_a_lambda(dtype, conjunto):
+    validos = {1, 3, 5}
+    serie = pd.Series([1, 2, 3, None, 5, 7], dtype=dtype)
+    antigo = serie.apply(lambda x: x in validos)
+    novo = _mascara(pd.DataFrame({'id_cliente_raw': serie}), 'cliente_valido', {'clientes_validos_ids': conjunto(validos)})
+    assert novo == antigo.tolist()
+
+
+@pytest.mark.parametrize('dtype', ['float64', 'Int64', object])
+def test_cliente_nulo_nao_casa_com_cliente_valido_nulo(dtype):
+    # Um cliente válido sem id põe o nulo no conjunto; a lambda antiga (x in conjunto) não casava nulos
+    serie = pd.Series([1, None, 2], dtype=dtype)
+    contexto = {'clientes_validos_ids': {1.0, np.nan, None, pd.NA}}
+    assert _mascara(pd.DataFrame({'id_cliente_raw': serie}), 'cliente_valido', contexto) == [True, False, False]
+
+
+def _validacao_antiga(df):
+    """validate_data antes da vetorização, só com o que decide quais linhas são válidas."""
+    clientes = df[['id_cliente_raw', 'nome', 'email']].drop_duplicates(subset=['id_cliente_raw']).copy()
+    clientes['email'] = clientes['email'].astype(str).str.strip().str.lower()
+    clientes['nome'] = clientes['nome'].fillna('').astype(str).str.strip().str.title()
+    clientes['email_valido'] = clientes['email'].apply(LAMBDAS_ANTIGAS['email_valido'])
+    clientes['nome_valido'] = clientes['nome'].apply(LAMBDAS_ANTIGAS['nome_valido'])
+    ids_clientes = set(clientes.loc[clientes['email_valido'] & clientes['nome_valido'], 'id_cliente_raw'])
+
+    vendas = df.copy()
+    vendas['status_pedido'] = vendas['status_pedido'].astype(str).str.strip().str.lower().map(validate.STATUS_MAP)
+    vendas = vendas[vendas['status_pedido'].notna()]
+    vendas['data_venda'] = pd.to_datetime(vendas['data_venda'], errors='coerce')
+    valida = (vendas['data_venda'].notna()
+              & vendas['valor_venda'].apply(LAMBDAS_ANTIGAS['valor_venda_valido'])
+              & vendas['id_cliente_raw'].apply(lambda x: x in ids_clientes))
+    return ids_clientes, set(vendas.loc[valida, 'id_venda_raw'])
+
+
+def _extraido(n: int, seed: int = 42) -> pd.DataFrame:
+    """Extraído sintético com clientes repetidos, emails e nomes inválidos, ids nulos e vendas órfãs."""
+    rng = np.random.default_rng(seed)
+    # Alguns ids nulos, inclusive de clientes válidos: as vendas deles não podem ser aprovadas
+    id_cliente = pd.array(rng.integers(1, n // 5, n), dtype='Int64')
+    id_cliente[rng.random(n) < 0.02] = pd.NA
+    return pd.DataFrame({
+        'id_cliente_raw': id_cliente,
+        'nome': rng.choice(np.array(NOMES, dtype=object), n),
+        'email': rng.choice(np.array(EMAILS, dtype=object), n),
+        'cidade': rng.choice(np.array(['São Paulo', None], dtype=object), n),
+        'estado': rng.choice(np.array(['SP', None], dtype=object), n),
+        'id_venda_raw': np.arange(n),
+        'data_venda': rng.choice(np.array(['2024-01-02', 'xx', None], dtype=object), n),
+        'valor_venda': rng.choice(np.array(VALORES, dtype='float64'), n),
+        # Só as chaves exatas do mapa: a comparação sem acentos aceita variantes que a versão antiga recusava
+        'status_pedido': rng.choice(np.array(list(validate.STATUS_MAP) + ['cancelado', None], dtype=object), n),
+    })
+
+
+def test_clean_and_validate_aprova_as_mesmas_linhas():
+    df = _extraido(10000)
+    ids_clientes, ids_vendas = _validacao_antiga(df)
+    particoes = validate.clean_and_validate(df)
+    assert set(particoes['clientes_validos']['id_cliente']) == ids_clientes
+    assert set(particoes['vendas_validas']['id_venda_raw']) == ids_vendas
+
+
+def _iguais(obtido: pd.DataFrame, esperado: pd.DataFrame) -> None:
+    """Mesmas linhas na mesma ordem, ignorando índice e tipos (category, string[pyarrow], Int64...)."""
+    pd.testing.assert_frame_equal(obtido.reset_index(drop=True).astype(object),
+                                  esperado.reset_index(drop=True).astype(object), check_dtype=False)
+
+
+def _rejeitados(caminhos: list) -> pd.DataFrame:
+    return pd.concat([pd.read_parquet(c) for c in caminhos]) if caminhos else pd.DataFrame()
+
+
+@pytest.mark.parametrize('tamanho', [7, 100, 100000])
+def test_validate_em_lotes_igual_a_validacao_em_memoria(tmp_path, monkeypatch, tamanho):
+    monkeypatch.setattr(quarentena, 'destino_padrao', 'arquivo')
+    monkeypatch.setattr(quarentena, 'quarentena_dir', str(tmp_path / 'quarentena'))
+    origem = artefatos.salvar(_extraido(1000), 'df_extraido', str(tmp_path))
+
+    caminhos = validate.validate_em_lotes(origem, 'lotes', tamanho=tamanho, temp_dir=str(tmp_path / 'lotes'))
+    esperado = validate.clean_and_validate(artefatos.carregar(origem, colunas=validate.COLUNAS_ENTRADA,
+                                                              compactar=True, strings_arrow=False))
+
+    assert os.path.dirname(caminhos['clientes']) == str(tmp_path / 'lotes')
+    _iguais(pd.read_parquet(caminhos['clientes']), esperado['clientes_validos'])
+    _iguais(pd.read_parquet(caminhos['vendas']), esperado['vendas_validas'])
+    # Rejeitados: mesmas linhas e mesmas regras violadas
+    for nome, chave, ids_regras in [('clientes_invalidos', 'id_cliente_raw', validate.IDS_REGRAS_CLIENTES),
+                                    ('vendas_invalidas', 'id_venda_raw', validate.IDS_REGRAS_VENDAS)]:
+        rejeitados = _rejeitados(caminhos[nome])
+        _iguais(rejeitados[[chave, 'regras_violadas']],
+                pd.DataFrame({chave: esperado[nome][chave],
+                              'regras_violadas': quarentena.regras_violadas(esperado[nome], ids_regras)}))
+
+
+@pytest.mark.parametrize('processos', [1, 3])
+def test_validacao_paralela_igual_a_sequencial(tmp_path, processos):
+    origem = artefatos.salvar(_extraido(5000), 'df_extraido', str(tmp_path))
+
+    paralelo = validate.clean_and_validate_paralelo(origem, processos=processos, temp_dir=str(tmp_path))
+    sequencial = validate.clean_and_validate(artefatos.carregar(origem, colunas=validate.COLUNAS_ENTRADA,
+                                                                compactar=True, strings_arrow=False))
+
+    for nome in ['clientes_validos', 'clientes_invalidos', 'vendas_validas', 'vendas_invalidas']:
+        assert not sequencial[nome].empty
+        _iguais(paralelo[nome], sequencial[nome])
+    assert not os.path.exists(tmp_path / 'df_extraido.arrow')